@@ -2,32 +2,134 @@
 Application services for the AVCF system.
 """
 
+from collections import OrderedDict
+from datetime import datetime
+from email.utils import formatdate
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Union, Dict, Any, Tuple
-import tempfile
+from typing import Optional, Dict, Any, Tuple, List
+import hashlib
 import os
-import shutil
+import threading
+import time
 import requests
-from urllib.parse import urlparse
 
 from ..domain.crypto import CryptoService
-from ..domain.models import AVCFMetadata, SignedAVCFBlock, VerificationResult, SignatureStatus
-from ..infra.container import ContainerFactory, ContainerAdapter
-from ..infra.exceptions import AVCFError, AVCFKeyError, AVCFContainerError
+from ..domain.models import SignedAVCFBlock, VerificationResult, SignatureStatus
+from ..infra.container import ContainerFactory
+from ..infra.exceptions import AVCFError, AVCFKeyError
 
 
-class SigningService:
-    """Service for signing video files with AVCF metadata."""
+# Maximum number of verification results cached per VerificationService
+RESULT_CACHE_SIZE = 1024
+
+# Time in seconds for which a public key fetched from a URL is reused without revalidation
+KEY_CACHE_TTL = 24 * 60 * 60
+
+# Accept header sent when fetching public keys from URLs
+KEY_ACCEPT = "application/pgp-keys, text/plain"
+
+
+def default_key_cache_dir() -> Path:
+    """
+    Get the default directory for caching public keys fetched from URLs.
+    
+    Returns:
+        $XDG_CACHE_HOME/avcf/keys, or ~/.cache/avcf/keys if XDG_CACHE_HOME is not set.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(Path.home(), '.cache')
+    return Path(cache_home) / 'avcf' / 'keys'
+
+
+@lru_cache(maxsize=4)
+def shared_crypto_service(gnupg_home: Path) -> CryptoService:
+    """
+    Get a crypto service for a GnuPG home directory, shared within the process.
+    
+    Services created for the same GnuPG home reuse one GnuPG context instead of
+    setting up a new one each time.
+    
+    Args:
+        gnupg_home: Resolved path to the GnuPG home directory.
+    
+    Returns:
+        Crypto service for the GnuPG home directory.
+    """
+    return CryptoService(gnupg_home)
+
+
+class KeyringService:
+    """Base class for services that look up keys in the GnuPG keyring."""
     
     def __init__(self, crypto_service: Optional[CryptoService] = None, gnupg_home: Optional[Path] = None):
         """
-        Initialize the signing service.
+        Initialize the service.
         
         Args:
             crypto_service: Crypto service to use. If None, a new one will be created.
             gnupg_home: Path to the GnuPG home directory. If None, a temporary directory will be used.
+                Services for the same directory share one crypto service.
+        """
+        # Only a crypto service with its own temporary directory is closed with the service
+        self._owns_crypto_service = crypto_service is None and gnupg_home is None
+        if crypto_service is None:
+            if gnupg_home is not None:
+                crypto_service = shared_crypto_service(Path(gnupg_home).resolve())
+            else:
+                crypto_service = CryptoService()
+        self.crypto_service = crypto_service
+    
+    def close(self) -> None:
+        """Release the resources held by the service."""
+        if self._owns_crypto_service:
+            self.crypto_service.close()
+    
+    def __enter__(self) -> 'KeyringService':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+    
+    def invalidate_keys(self) -> None:
+        """Discard the cached key list so it is re-read from GnuPG on next use."""
+        self.crypto_service.invalidate_keys()
+    
+    def _get_keys(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the keys in the keyring, indexed by fingerprint and key ID.
+        
+        The key list is cached by the crypto service, so it is shared with every service
+        using it and refreshed when any of them imports a key.
+        
+        Returns:
+            Dictionary mapping upper-case fingerprints, long key IDs and short key IDs to keys.
         """
-        self.crypto_service = crypto_service or CryptoService(gnupg_home)
+        return self.crypto_service.get_keys()
+    
+    def _find_key(self, key_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a key by key ID or fingerprint.
+        
+        Args:
+            key_id: Key ID or fingerprint, optionally containing spaces.
+        
+        Returns:
+            The matching key, or None if no key matches.
+        """
+        keys = self._get_keys()
+        key = keys.get(key_id.replace(' ', '').upper())
+        if key is not None:
+            return key
+        
+        # Fall back to a partial match on the key ID or fingerprint
+        for candidate in keys.values():
+            if key_id in candidate.get('keyid', '') or key_id in candidate['fingerprint']:
+                return candidate
+        return None
+
+
+class SigningService(KeyringService):
+    """Service for signing video files with AVCF metadata."""
     
     def sign_video(self, 
                   input_path: Path, 
@@ -40,7 +142,8 @@ class SigningService:
                   embed_pubkey: bool = False,
                   passphrase: Optional[str] = None,
                   tags: Optional[list] = None,
-                  notes: Optional[str] = None) -> Path:
+                  notes: Optional[str] = None,
+                  hash_scheme: Optional[str] = None) -> Path:
         """
         Sign a video file with AVCF metadata.
         
@@ -56,26 +159,19 @@ class SigningService:
             passphrase: Passphrase for the private key.
             tags: Optional tags for categorization.
             notes: Optional notes about the content.
-            
+            hash_scheme: Scheme used to hash the video. If None, the default scheme is used.
+        
         Returns:
             Path to the signed video file.
-            
+        
         Raises:
             AVCFError: If the video cannot be signed.
         """
         # Get the public key fingerprint
-        keys = self.crypto_service.gpg.list_keys()
-        key_found = False
-        pubkey_fingerprint = None
-        
-        for key in keys:
-            if key_id in key['keyid'] or key_id in key['fingerprint']:
-                pubkey_fingerprint = key['fingerprint']
-                key_found = True
-                break
-        
-        if not key_found:
+        key = self._find_key(key_id)
+        if key is None:
             raise AVCFKeyError(f"Private key not found: {key_id}")
+        pubkey_fingerprint = key['fingerprint']
         
         # Get the embedded public key if requested
         embedded_pubkey = None
@@ -95,7 +191,8 @@ class SigningService:
             pubkey_url=pubkey_url,
             embedded_pubkey=embedded_pubkey,
             tags=tags,
-            notes=notes
+            notes=notes,
+            hash_scheme=hash_scheme
         )
         
         # Sign the metadata
@@ -118,18 +215,37 @@ class SigningService:
         return output_path
 
 
-class VerificationService:
+class VerificationService(KeyringService):
     """Service for verifying AVCF signatures in video files."""
     
-    def __init__(self, crypto_service: Optional[CryptoService] = None, gnupg_home: Optional[Path] = None):
+    def __init__(self, crypto_service: Optional[CryptoService] = None, gnupg_home: Optional[Path] = None,
+                 key_cache_dir: Optional[Path] = None, key_cache_ttl: float = KEY_CACHE_TTL):
         """
         Initialize the verification service.
         
         Args:
             crypto_service: Crypto service to use. If None, a new one will be created.
             gnupg_home: Path to the GnuPG home directory. If None, a temporary directory will be used.
+            key_cache_dir: Directory for caching public keys fetched from URLs. If None, keys
+                are only cached in memory.
+            key_cache_ttl: Time in seconds for which a fetched key is reused without revalidation.
         """
-        self.crypto_service = crypto_service or CryptoService(gnupg_home)
+        super().__init__(crypto_service, gnupg_home)
+        self.key_cache_dir = key_cache_dir
+        self.key_cache_ttl = key_cache_ttl
+        self._result_cache: "OrderedDict[bytes, VerificationResult]" = OrderedDict()
+        self._result_cache_lock = threading.Lock()
+        self._url_cache: Dict[str, Tuple[float, List[str]]] = {}
+        self._session: Optional[requests.Session] = None
+        self._session_lock = threading.Lock()
+    
+    def close(self) -> None:
+        """Release the resources held by the service, including the HTTP session."""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+        super().close()
     
     def verify_video(self, video_path: Path, fetch_keys: bool = True) -> VerificationResult:
         """
@@ -138,10 +254,10 @@ class VerificationService:
         Args:
             video_path: Path to the video file.
             fetch_keys: Whether to fetch missing public keys from URLs.
-            
+        
         Returns:
             Verification result.
-            
+        
         Raises:
             AVCFError: If the verification fails.
         """
@@ -157,58 +273,116 @@ class VerificationService:
                 error_message="No AVCF metadata found in the video file"
             )
         
-        # If we should fetch missing keys and we have a URL
-        if fetch_keys and signed_block.metadata.pubkey_url and not self._has_key(signed_block.metadata.pubkey_fingerprint):
+        # Return the cached result if this block and file were verified before
+        cache_key = self._result_cache_key(video_path, signed_block)
+        with self._result_cache_lock:
+            cached_result = self._result_cache.get(cache_key)
+            if cached_result is not None:
+                self._result_cache.move_to_end(cache_key)
+        if cached_result is not None:
+            return cached_result.model_copy(update={'verification_time': datetime.utcnow()})
+        
+        result = self._verify_signed_block(video_path, signed_block, fetch_keys)
+        
+        # Only definitive results are cached; key and I/O errors may be transient
+        if result.status in (SignatureStatus.VALID, SignatureStatus.INVALID):
+            with self._result_cache_lock:
+                self._result_cache[cache_key] = result
+                if len(self._result_cache) > RESULT_CACHE_SIZE:
+                    self._result_cache.popitem(last=False)
+        
+        return result
+    
+    def _verify_signed_block(self, video_path: Path, signed_block: SignedAVCFBlock,
+                             fetch_keys: bool) -> VerificationResult:
+        """
+        Verify an extracted AVCF block against its video file.
+        
+        Args:
+            video_path: Path to the video file.
+            signed_block: Signed AVCF block extracted from the video file.
+            fetch_keys: Whether to fetch missing public keys from URLs.
+        
+        Returns:
+            Verification result.
+        """
+        metadata = signed_block.metadata
+        
+        # If we should fetch missing keys and we have a URL, fetch the key
+        if fetch_keys and metadata.pubkey_url and not self._has_key(metadata.normalized_fingerprint):
             try:
-                self._fetch_key(signed_block.metadata.pubkey_url)
-            except Exception as e:
+                self._fetch_key(metadata.pubkey_url)
+            except AVCFKeyError as fetch_error:
                 # If fetching fails but we have an embedded key, try that instead
-                if signed_block.metadata.embedded_pubkey:
+                if metadata.embedded_pubkey:
                     try:
-                        self.crypto_service.import_key(signed_block.metadata.embedded_pubkey)
+                        self.crypto_service.import_key(metadata.embedded_pubkey)
                     except AVCFError:
                         return VerificationResult(
                             status=SignatureStatus.KEY_NOT_FOUND,
-                            metadata=signed_block.metadata,
-                            error_message=f"Failed to fetch key from URL and failed to import embedded key: {e}"
+                            metadata=metadata,
+                            error_message=f"Failed to fetch key from URL and failed to import embedded key: {fetch_error}"
                         )
                 else:
                     return VerificationResult(
                         status=SignatureStatus.KEY_NOT_FOUND,
-                        metadata=signed_block.metadata,
-                        error_message=f"Failed to fetch key from URL and no embedded key available: {e}"
+                        metadata=metadata,
+                        error_message=f"Failed to fetch key from URL and no embedded key available: {fetch_error}"
                     )
         
-        # Verify the signature
-        sig_result = self.crypto_service.verify_signature(signed_block)
+        # Check the signature first, so the unsigned block cannot make us hash the video
+        result = self.crypto_service.verify_signature(signed_block)
+        if result.status != SignatureStatus.VALID:
+            return result
         
-        # If the signature is valid, also verify the video hash
-        if sig_result.status == SignatureStatus.VALID:
-            hash_valid = self.crypto_service.verify_video_hash(video_path, signed_block.metadata)
-            if not hash_valid:
-                return VerificationResult(
-                    status=SignatureStatus.INVALID,
-                    metadata=signed_block.metadata,
-                    error_message="Video hash does not match the hash in the metadata"
-                )
+        video_hash = self.crypto_service.hash_video(video_path, metadata.hash_scheme)
+        if video_hash != metadata.video_hash:
+            return VerificationResult(
+                status=SignatureStatus.INVALID,
+                metadata=metadata,
+                error_message="Video hash does not match the hash in the metadata"
+            )
+        return result
+    
+    @staticmethod
+    def _result_cache_key(video_path: Path, signed_block: SignedAVCFBlock) -> bytes:
+        """
+        Build the result cache key for a signed block and the file it was extracted from.
         
-        return sig_result
+        The key covers the signature, the full metadata and the file's identity, so a
+        modified or replaced file or block never hits a cached result. The identity
+        includes the change time, which unlike the modification time cannot be set back.
+        
+        Args:
+            video_path: Path to the video file.
+            signed_block: Signed AVCF block extracted from the video file.
+        
+        Returns:
+            Cache key.
+        """
+        stat = os.stat(video_path)
+        key = hashlib.blake2b(digest_size=16)
+        key.update(signed_block.signature.encode())
+        key.update(signed_block.metadata.canonical_json.encode())
+        key.update(f"{os.path.abspath(video_path)}:{stat.st_dev}:{stat.st_ino}:{stat.st_mtime_ns}:"
+                   f"{stat.st_ctime_ns}:{stat.st_size}".encode())
+        return key.digest()
     
     def _has_key(self, fingerprint: str) -> bool:
         """
         Check if we have a public key with the given fingerprint.
         
         Args:
-            fingerprint: Fingerprint of the public key.
-            
+            fingerprint: Fingerprint of the public key, without spaces and in upper case
+                (see AVCFMetadata.normalized_fingerprint).
+        
         Returns:
             True if we have the key, False otherwise.
         """
-        keys = self.crypto_service.gpg.list_keys()
-        for key in keys:
-            if fingerprint in key['fingerprint']:
-                return True
-        return False
+        keys = self._get_keys()
+        if fingerprint in keys:
+            return True
+        return any(fingerprint in key['fingerprint'] for key in keys.values())
     
     def _fetch_key(self, url: str) -> list:
         """
@@ -216,19 +390,91 @@ class VerificationService:
         
         Args:
             url: URL to fetch the key from.
-            
+        
         Returns:
             List of fingerprints of imported keys.
-            
+        
         Raises:
             AVCFKeyError: If the key cannot be fetched or imported.
         """
+        url = str(url)
+        now = time.time()
+        
+        # Skip the fetch if the key was recently imported from this URL and is still present
+        cached = self._url_cache.get(url)
+        if cached is not None and now - cached[0] < self.key_cache_ttl:
+            if all(self._has_key(fingerprint) for fingerprint in cached[1]):
+                return cached[1]
+        
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            key_data = response.text
-            return self.crypto_service.import_key(key_data)
+            key_data = self._download_key(url, now)
+            fingerprints = self.crypto_service.import_key(key_data)
         except requests.exceptions.RequestException as e:
             raise AVCFKeyError(f"Failed to fetch key from URL: {e}")
+        except UnicodeDecodeError as e:
+            raise AVCFKeyError(f"Key fetched from URL is not ASCII-armored: {e}")
         except AVCFError as e:
             raise AVCFKeyError(f"Failed to import key from URL: {e}")
+        
+        self._url_cache[url] = (now, fingerprints)
+        return fingerprints
+    
+    def _get_session(self) -> requests.Session:
+        """Get the HTTP session used to fetch keys, creating it on first use."""
+        with self._session_lock:
+            if self._session is None:
+                self._session = requests.Session()
+            return self._session
+    
+    def _download_key(self, url: str, now: float) -> str:
+        """
+        Download a public key, using the on-disk key cache if one is configured.
+        
+        A cached copy younger than the TTL is used as is; an older copy is revalidated
+        with If-Modified-Since.
+        
+        Args:
+            url: URL to fetch the key from.
+            now: Current time, as returned by time.time().
+        
+        Returns:
+            ASCII-armored key data.
+        
+        Raises:
+            requests.exceptions.RequestException: If the key cannot be fetched.
+            UnicodeDecodeError: If the fetched key is not ASCII.
+        """
+        cache_path = None
+        cached_mtime = None
+        if self.key_cache_dir is not None:
+            cache_path = Path(self.key_cache_dir) / f"{hashlib.sha256(url.encode()).hexdigest()}.asc"
+            try:
+                cached_mtime = cache_path.stat().st_mtime
+            except OSError:
+                cached_mtime = None
+            if cached_mtime is not None and now - cached_mtime < self.key_cache_ttl:
+                return cache_path.read_text()
+        
+        headers = {'Accept': KEY_ACCEPT}
+        if cached_mtime is not None:
+            headers['If-Modified-Since'] = formatdate(cached_mtime, usegmt=True)
+        
+        response = self._get_session().get(url, timeout=10, headers=headers)
+        if cached_mtime is not None and response.status_code == 304:
+            os.utime(cache_path)
+            return cache_path.read_text()
+        response.raise_for_status()
+        # ASCII-armored keys are ASCII by definition, so skip requests' charset detection
+        key_data = response.content.decode('ascii')
+        
+        if cache_path is not None:
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                temp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+                temp_path.write_text(key_data)
+                os.replace(temp_path, cache_path)
+            except OSError:
+                # The cache is an optimization; a read-only cache directory is not an error
+                pass
+        
+        return key_data
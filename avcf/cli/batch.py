@@ -0,0 +1,114 @@
+"""
+Helpers for batch processing in the AVCF command-line tools.
+"""
+
+import json
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import List, Dict, Any, Callable
+
+from ..infra.exceptions import AVCFError
+
+
+def read_path_list(list_file: str) -> List[Path]:
+    """
+    Read a list of video paths from a text file.
+    
+    Each non-empty line is a path; lines starting with '#' are ignored.
+    Relative paths are resolved against the current directory.
+    
+    Args:
+        list_file: Path to the text file.
+    
+    Returns:
+        List of resolved video paths.
+    
+    Raises:
+        AVCFError: If the file cannot be read.
+    """
+    try:
+        with open(list_file, 'r') as f:
+            lines = [line.strip() for line in f]
+    except IOError as e:
+        raise AVCFError(f"Error reading batch file {list_file}: {e}")
+    
+    return [Path(line).resolve() for line in lines if line and not line.startswith('#')]
+
+
+def read_manifest(manifest_file: str) -> List[Dict[str, Any]]:
+    """
+    Read a batch manifest from a JSON file.
+    
+    The manifest is a JSON array of objects, each with at least an 'input' key.
+    
+    Args:
+        manifest_file: Path to the JSON manifest.
+    
+    Returns:
+        List of manifest entries.
+    
+    Raises:
+        AVCFError: If the manifest cannot be read or is malformed.
+    """
+    try:
+        with open(manifest_file, 'r') as f:
+            entries = json.load(f)
+    except (json.JSONDecodeError, IOError) as e:
+        raise AVCFError(f"Error loading batch manifest from {manifest_file}: {e}")
+    
+    if not isinstance(entries, list):
+        raise AVCFError(f"Batch manifest {manifest_file} must contain a JSON array")
+    
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict) or 'input' not in entry:
+            raise AVCFError(f"Entry {index} in batch manifest {manifest_file} has no 'input' path")
+    
+    return entries
+
+
+# Service used by the current batch worker process, set by _init_worker
+_worker_state: Dict[str, Any] = {}
+
+
+def run_batch(worker: Callable[[Any, Any], Any], items: List[Any], jobs: int,
+              service_factory: Callable[..., Any], service_kwargs: Dict[str, Any]) -> List[Any]:
+    """
+    Run a worker function over batch items, in parallel processes if requested.
+    
+    Each process builds one service with service_factory and passes it to the
+    worker for every item it handles. With a single job the items are handled
+    in the current process.
+    
+    Args:
+        worker: Module-level function called as worker(service, item).
+        items: Items to process.
+        jobs: Maximum number of worker processes.
+        service_factory: Callable that creates the service, e.g. a service class. In the
+            current process the service is used as a context manager and closed afterwards.
+        service_kwargs: Keyword arguments for service_factory.
+    
+    Returns:
+        Worker results, in the same order as the items.
+    """
+    if jobs <= 1 or len(items) <= 1:
+        with service_factory(**service_kwargs) as service:
+            return [worker(service, item) for item in items]
+    
+    with ProcessPoolExecutor(max_workers=min(jobs, len(items)), initializer=_init_worker,
+                             initargs=(service_factory, service_kwargs)) as executor:
+        return list(executor.map(partial(_run_worker, worker), items))
+
+
+def _init_worker(service_factory: Callable[..., Any], service_kwargs: Dict[str, Any]) -> None:
+    """Create the service for a batch worker process, closed when the process exits."""
+    service = service_factory(**service_kwargs)
+    # Worker processes exit without unwinding a context manager, so register the close instead
+    multiprocessing.util.Finalize(None, service.close, exitpriority=10)
+    _worker_state['service'] = service
+
+
+def _run_worker(worker: Callable[[Any, Any], Any], item: Any) -> Any:
+    """Run a worker function with the service of the current worker process."""
+    return worker(_worker_state['service'], item)
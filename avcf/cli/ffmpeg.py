@@ -4,19 +4,28 @@ Command-line interface for processing and signing videos with FFmpeg.
 
 import sys
 import os
+import copy
 import json
 from pathlib import Path
 from typing import Optional, List, Dict, Any, Tuple
 from dataclasses import dataclass, field
+from functools import lru_cache
 
 import click
 
-from ..app.services import SigningService
-from ..infra.ffmpeg_wrapper import FFmpegWrapper
 from ..infra.exceptions import AVCFError
 
+try:
+    import orjson
+except ImportError:  # orjson is an optional speedup
+    orjson = None
 
-@dataclass
+
+# Slotted dataclasses need Python 3.10 or later
+_DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(frozen=True, **_DATACLASS_SLOTS)
 class CliArgs:
     """Container for CLI arguments to reduce parameter count."""
     input_file: str
@@ -37,7 +46,33 @@ class CliArgs:
     filter_complex: Optional[str] = None
 
 
-@dataclass
+def _file_stamp(path: Optional[str]) -> Optional[Tuple[int, int]]:
+    """Get the modification time and size of a file, or None if there is no such file."""
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+@lru_cache(maxsize=32)
+def _load_json_file(path: str, stamp: Optional[Tuple[int, int]]) -> Any:
+    """
+    Load a JSON file, memoized on its path and modification stamp.
+    
+    Uses orjson when it is installed. The parsed value is shared between calls,
+    so callers must not modify it.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class FFmpegConfig:
     """Configuration for FFmpeg processing and signing."""
     input_path: Path
@@ -56,7 +91,22 @@ class FFmpegConfig:
     
     @classmethod
     def from_cli_args(cls, args: CliArgs) -> 'FFmpegConfig':
-        """Create a config from CLI arguments."""
+        """
+        Create a config from CLI arguments.
+        
+        Configs are memoized per process; the passphrase and FFmpeg argument files
+        are only re-read when their modification time or size changes.
+        """
+        config = cls._from_cli_args_cached(
+            args, os.getcwd(), _file_stamp(args.passphrase_file), _file_stamp(args.ffmpeg_args))
+        # Callers get their own copy so the cached config cannot be modified
+        return copy.deepcopy(config)
+    
+    @classmethod
+    @lru_cache(maxsize=64)
+    def _from_cli_args_cached(cls, args: CliArgs, cwd: str, passphrase_stamp: Optional[Tuple[int, int]],
+                              ffmpeg_args_stamp: Optional[Tuple[int, int]]) -> 'FFmpegConfig':
+        """Create a config from CLI arguments, memoized on the arguments and the files they name."""
         # Convert paths
         input_path = Path(args.input_file).resolve()
         output_path = Path(args.output).resolve()
@@ -92,7 +142,7 @@ class FFmpegConfig:
         """Read passphrase from file if specified."""
         if not passphrase_file:
             return None
-            
+        
         with open(passphrase_file, 'r') as f:
             return f.read().strip()
     
@@ -122,20 +172,20 @@ class FFmpegConfig:
         """Load arguments from JSON file if provided."""
         if not ffmpeg_args:
             return result
-            
+        
         try:
-            with open(ffmpeg_args, 'r') as f:
-                json_args = json.load(f)
-                
+            json_args = _load_json_file(ffmpeg_args, _file_stamp(ffmpeg_args))
+            
             # Update result with JSON arguments
             for key, value in json_args.items():
                 if key in result:
                     result[key].update(value)
                 else:
-                    result[key] = value
+                    # The parsed file is shared between calls, so do not keep references into it
+                    result[key] = copy.deepcopy(value)
         except (json.JSONDecodeError, IOError) as e:
             raise AVCFError(f"Error loading FFmpeg arguments from {ffmpeg_args}: {e}")
-            
+        
         return result
     
     @staticmethod
@@ -159,14 +209,10 @@ class FFmpegConfig:
     @staticmethod
     def _parse_filter_string(filter_str: str) -> Dict[str, Any]:
         """Parse filter string into dictionary."""
-        filter_dict = {}
-        for param in filter_str.split(':'):
-            if '=' in param:
-                name, value = param.split('=', 1)
-                filter_dict[name] = value
-            else:
-                filter_dict[param] = True
-        return filter_dict
+        return {
+            name: value if separator else True
+            for name, separator, value in (param.partition('=') for param in filter_str.split(':'))
+        }
 
 
 @click.command()
@@ -229,6 +275,10 @@ def main(**kwargs) -> None:
 
 def process_and_sign_video(config: FFmpegConfig) -> None:
     """Process and sign a video using the provided configuration."""
+    # Imported here so that --help and usage errors do not load GnuPG, requests and ffmpeg
+    from ..app.services import SigningService
+    from ..infra.ffmpeg_wrapper import FFmpegWrapper
+    
     # Create the signing service
     signing_service = SigningService(gnupg_home=config.gnupg_home)
     
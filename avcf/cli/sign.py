@@ -3,18 +3,22 @@ Command-line interface for signing video files with AVCF metadata.
 """
 
 import sys
-import os
 from pathlib import Path
-from typing import Optional
+from functools import partial
+from typing import Optional, Dict, Any, Tuple, TYPE_CHECKING
 
 import click
 
-from ..app.services import SigningService
 from ..infra.exceptions import AVCFError
+from ..infra.hashing import SIGNING_HASH_SCHEMES
+from .batch import read_manifest, run_batch
+
+if TYPE_CHECKING:
+    from ..app.services import SigningService
 
 
 @click.command()
-@click.argument('input_file', type=click.Path(exists=True, dir_okay=False, readable=True))
+@click.argument('input_file', required=False, type=click.Path(exists=True, dir_okay=False, readable=True))
 @click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True),
               help='Output file path. If not specified, a suffix will be added to the input file name.')
 @click.option('--key', '-k', required=True,
@@ -35,58 +39,81 @@ from ..infra.exceptions import AVCFError
               help='Tags for categorization. Can be specified multiple times.')
 @click.option('--notes',
               help='Notes about the content.')
+@click.option('--hash-scheme', type=click.Choice(SIGNING_HASH_SCHEMES),
+              help='Scheme used to hash the video. Defaults to sha256-streams, which hashes only the '
+                   'audio/video packets.')
 @click.option('--passphrase-file', type=click.Path(exists=True, dir_okay=False, readable=True),
               help='File containing the passphrase for the private key.')
-def main(input_file: str, output: Optional[str], key: str, author_name: str,
+@click.option('--batch', 'batch_file', type=click.Path(exists=True, dir_okay=False, readable=True),
+              help='JSON manifest of videos to sign. Each entry needs an "input" path and may set '
+                   '"output" and override any metadata option.')
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=1,
+              help='Number of videos to sign in parallel in batch mode.')
+def main(input_file: Optional[str], output: Optional[str], key: str, author_name: str,
          author_email: Optional[str], author_org: Optional[str], pubkey_url: Optional[str],
          embed_pubkey: bool, gnupg_home: Optional[str], tag: tuple, notes: Optional[str],
-         passphrase_file: Optional[str]) -> None:
+         hash_scheme: Optional[str], passphrase_file: Optional[str], batch_file: Optional[str],
+         jobs: int) -> None:
     """
     Sign a video file with AVCF metadata.
     
-    INPUT_FILE is the path to the video file to sign.
+    INPUT_FILE is the path to the video file to sign. Use --batch instead to
+    sign several videos with a single GnuPG context per job.
     """
+    if bool(input_file) == bool(batch_file):
+        raise click.UsageError("Specify either INPUT_FILE or --batch.")
+    
+    # Imported here so that --help and usage errors do not load GnuPG and requests
+    from ..app.services import SigningService
+    
     try:
-        # Convert paths
-        input_path = Path(input_file).resolve()
-        
-        if output:
-            output_path = Path(output).resolve()
-        else:
-            # Add a suffix to the input file name
-            stem = input_path.stem
-            suffix = input_path.suffix
-            output_path = input_path.with_name(f"{stem}_signed{suffix}")
-        
         # Get the passphrase if a file is specified
         passphrase = None
         if passphrase_file:
             with open(passphrase_file, 'r') as f:
                 passphrase = f.read().strip()
         
+        # Options shared by every video, overridable per manifest entry
+        defaults = {
+            'key': key,
+            'author_name': author_name,
+            'author_email': author_email,
+            'author_org': author_org,
+            'pubkey_url': pubkey_url,
+            'embed_pubkey': embed_pubkey,
+            'tags': list(tag) if tag else None,
+            'notes': notes,
+            'hash_scheme': hash_scheme,
+        }
+        
+        if batch_file:
+            entries = read_manifest(batch_file)
+        else:
+            entries = [{'input': input_file, 'output': output}]
+        
         # Convert gnupg_home to Path if specified
         gnupg_home_path = Path(gnupg_home) if gnupg_home else None
         
-        # Create the signing service
-        signing_service = SigningService(gnupg_home=gnupg_home_path)
-        
-        # Sign the video
-        signed_path = signing_service.sign_video(
-            input_path=input_path,
-            output_path=output_path,
-            key_id=key,
-            author_name=author_name,
-            author_email=author_email,
-            author_organization=author_org,
-            pubkey_url=pubkey_url,
-            embed_pubkey=embed_pubkey,
-            passphrase=passphrase,
-            tags=list(tag) if tag else None,
-            notes=notes
+        # Sign the videos, with one signing service per job
+        outcomes = run_batch(
+            partial(sign_worker, defaults=defaults, passphrase=passphrase),
+            entries,
+            jobs,
+            SigningService,
+            {'gnupg_home': gnupg_home_path}
         )
         
-        click.echo(f"Video signed successfully: {signed_path}")
-        sys.exit(0)
+        failures = 0
+        for entry, (signed_path, error) in zip(entries, outcomes):
+            if error is None:
+                click.echo(f"Video signed successfully: {signed_path}")
+            elif batch_file:
+                failures += 1
+                click.echo(f"Error signing {entry['input']}: {error}", err=True)
+            else:
+                raise AVCFError(error)
+        
+        sys.exit(1 if failures else 0)
     except AVCFError as e:
         click.echo(f"Error: {e}", err=True)
         sys.exit(1)
@@ -95,5 +122,74 @@ def main(input_file: str, output: Optional[str], key: str, author_name: str,
         sys.exit(2)
 
 
+def sign_entry(signing_service: 'SigningService', entry: Dict[str, Any],
+               defaults: Dict[str, Any], passphrase: Optional[str]) -> Path:
+    """
+    Sign a single video described by a batch manifest entry.
+    
+    Args:
+        signing_service: Signing service to use.
+        entry: Manifest entry with an 'input' path, an optional 'output' path and
+            optional overrides for the keys in defaults.
+        defaults: Metadata options shared by all entries.
+        passphrase: Passphrase for the private key.
+    
+    Returns:
+        Path to the signed video file.
+    
+    Raises:
+        AVCFError: If the video cannot be signed.
+    """
+    options = {**defaults, **{k: v for k, v in entry.items() if k in defaults}}
+    
+    # Convert paths
+    input_path = Path(entry['input']).resolve()
+    
+    if entry.get('output'):
+        output_path = Path(entry['output']).resolve()
+    else:
+        output_path = default_output_path(input_path)
+    
+    return signing_service.sign_video(
+        input_path=input_path,
+        output_path=output_path,
+        key_id=options['key'],
+        author_name=options['author_name'],
+        author_email=options['author_email'],
+        author_organization=options['author_org'],
+        pubkey_url=options['pubkey_url'],
+        embed_pubkey=options['embed_pubkey'],
+        passphrase=passphrase,
+        tags=options['tags'],
+        notes=options['notes'],
+        hash_scheme=options['hash_scheme']
+    )
+
+
+def sign_worker(signing_service: 'SigningService', entry: Dict[str, Any], defaults: Dict[str, Any],
+                passphrase: Optional[str]) -> Tuple[Optional[Path], Optional[str]]:
+    """
+    Sign a batch manifest entry, reporting AVCF errors instead of raising them.
+    
+    Args:
+        signing_service: Signing service to use.
+        entry: Manifest entry to sign.
+        defaults: Metadata options shared by all entries.
+        passphrase: Passphrase for the private key.
+    
+    Returns:
+        Tuple of the signed video path and None, or None and an error message.
+    """
+    try:
+        return sign_entry(signing_service, entry, defaults, passphrase), None
+    except AVCFError as e:
+        return None, str(e)
+
+
+def default_output_path(input_path: Path) -> Path:
+    """Add a suffix to the input file name to get the default output path."""
+    return input_path.with_name(f"{input_path.stem}_signed{input_path.suffix}")
+
+
 if __name__ == '__main__':
     main()
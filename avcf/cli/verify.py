@@ -3,93 +3,90 @@ Command-line interface for verifying AVCF signatures in video files.
 """
 
 import sys
-import os
 import json
+from functools import partial
 from pathlib import Path
-from typing import Optional
-from datetime import datetime
+from typing import Optional, TYPE_CHECKING
 
 import click
 
-from ..app.services import VerificationService
-from ..domain.models import SignatureStatus
 from ..infra.exceptions import AVCFError
+from .batch import read_path_list, run_batch
+
+if TYPE_CHECKING:
+    from ..app.services import VerificationService
+    from ..domain.models import VerificationResult
 
 
 @click.command()
-@click.argument('video_file', type=click.Path(exists=True, dir_okay=False, readable=True))
+@click.argument('video_file', required=False, type=click.Path(exists=True, dir_okay=False, readable=True))
 @click.option('--gnupg-home', type=click.Path(file_okay=False, exists=True),
               help='Path to the GnuPG home directory.')
 @click.option('--no-fetch-keys', is_flag=True,
               help='Do not fetch missing public keys from URLs.')
+@click.option('--no-key-cache', is_flag=True,
+              help='Do not cache public keys fetched from URLs on disk.')
 @click.option('--json-output', is_flag=True,
               help='Output the result as JSON.')
-def main(video_file: str, gnupg_home: Optional[str], no_fetch_keys: bool, json_output: bool) -> None:
+@click.option('--batch', 'batch_file', type=click.Path(exists=True, dir_okay=False, readable=True),
+              help='Text file listing videos to verify, one path per line.')
+@click.option('--jobs', '-j', type=click.IntRange(min=1), default=1,
+              help='Number of videos to verify in parallel in batch mode.')
+def main(video_file: Optional[str], gnupg_home: Optional[str], no_fetch_keys: bool, no_key_cache: bool,
+         json_output: bool, batch_file: Optional[str], jobs: int) -> None:
     """
     Verify the AVCF signature in a video file.
     
-    VIDEO_FILE is the path to the video file to verify.
+    VIDEO_FILE is the path to the video file to verify. Use --batch instead to
+    verify several videos with a single GnuPG context per job.
     """
+    if bool(video_file) == bool(batch_file):
+        raise click.UsageError("Specify either VIDEO_FILE or --batch.")
+    
+    # Imported here so that --help and usage errors do not load GnuPG and requests
+    from ..app.services import VerificationService, default_key_cache_dir
+    from ..domain.models import SignatureStatus
+    
     try:
         # Convert paths
-        video_path = Path(video_file).resolve()
+        if batch_file:
+            video_paths = read_path_list(batch_file)
+        else:
+            video_paths = [Path(video_file).resolve()]
         
         # Convert gnupg_home to Path if specified
         gnupg_home_path = Path(gnupg_home) if gnupg_home else None
         
-        # Create the verification service
-        verification_service = VerificationService(gnupg_home=gnupg_home_path)
-        
-        # Verify the video
-        result = verification_service.verify_video(
-            video_path=video_path,
-            fetch_keys=not no_fetch_keys
+        # Verify the videos, with one verification service per job
+        verified = run_batch(
+            partial(verify_worker, fetch_keys=not no_fetch_keys, catch_errors=bool(batch_file)),
+            video_paths,
+            jobs,
+            VerificationService,
+            {
+                'gnupg_home': gnupg_home_path,
+                'key_cache_dir': None if no_key_cache else default_key_cache_dir()
+            }
         )
+        results = list(zip(video_paths, verified))
         
-        # Output the result
+        # Output the results
         if json_output:
-            # Convert the result to a JSON-serializable dict
-            result_dict = {
-                "status": result.status.value,
-                "verification_time": result.verification_time.isoformat(),
-                "error_message": result.error_message
-            }
-            
-            if result.metadata:
-                # Convert the metadata to a dict
-                metadata_dict = result.metadata.model_dump()
-                # Convert datetime to ISO format
-                metadata_dict["timestamp"] = metadata_dict["timestamp"].isoformat()
-                result_dict["metadata"] = metadata_dict
-            
-            click.echo(json.dumps(result_dict, indent=2))
+            if batch_file:
+                output = [{"file": str(video_path), **result.model_dump(mode='json')} for video_path, result in results]
+                click.echo(json.dumps(output, indent=2))
+            else:
+                click.echo(results[0][1].model_dump_json(indent=2))
         else:
-            # Output in a human-readable format
-            click.echo(f"Verification status: {result.status.value.upper()}")
-            
-            if result.error_message:
-                click.echo(f"Error: {result.error_message}")
-            
-            if result.metadata:
-                click.echo("\nMetadata:")
-                click.echo(f"  Author: {result.metadata.author_name}")
-                if result.metadata.author_email:
-                    click.echo(f"  Email: {result.metadata.author_email}")
-                if result.metadata.author_organization:
-                    click.echo(f"  Organization: {result.metadata.author_organization}")
-                click.echo(f"  Timestamp: {result.metadata.timestamp.isoformat()}")
-                click.echo(f"  Public key fingerprint: {result.metadata.pubkey_fingerprint}")
-                if result.metadata.pubkey_url:
-                    click.echo(f"  Public key URL: {result.metadata.pubkey_url}")
-                if result.metadata.embedded_pubkey:
-                    click.echo("  Public key: Embedded in metadata")
-                if result.metadata.tags:
-                    click.echo(f"  Tags: {', '.join(result.metadata.tags)}")
-                if result.metadata.notes:
-                    click.echo(f"  Notes: {result.metadata.notes}")
+            for index, (video_path, result) in enumerate(results):
+                if batch_file:
+                    if index > 0:
+                        click.echo()
+                    click.echo(f"{video_path}:")
+                echo_result(result)
         
         # Exit with appropriate status code
-        if result.status == SignatureStatus.VALID:
+        if all(result.status == SignatureStatus.VALID for _, result in results):
             sys.exit(0)
         else:
             sys.exit(1)
@@ -101,5 +98,58 @@ def main(video_file: str, gnupg_home: Optional[str], no_fetch_keys: bool, json_o
         sys.exit(2)
 
 
+def verify_worker(verification_service: 'VerificationService', video_path: Path, fetch_keys: bool,
+                  catch_errors: bool) -> 'VerificationResult':
+    """
+    Verify a single video file.
+    
+    Args:
+        verification_service: Verification service to use.
+        video_path: Path to the video file.
+        fetch_keys: Whether to fetch missing public keys from URLs.
+        catch_errors: Whether to report AVCF errors as an ERROR result instead of raising them.
+    
+    Returns:
+        Verification result.
+    
+    Raises:
+        AVCFError: If the verification fails and catch_errors is False.
+    """
+    from ..domain.models import SignatureStatus, VerificationResult
+    
+    try:
+        return verification_service.verify_video(video_path=video_path, fetch_keys=fetch_keys)
+    except AVCFError as e:
+        if not catch_errors:
+            raise
+        return VerificationResult(status=SignatureStatus.ERROR, error_message=str(e))
+
+
+def echo_result(result: 'VerificationResult') -> None:
+    """Output a verification result in a human-readable format."""
+    click.echo(f"Verification status: {result.status.value.upper()}")
+    
+    if result.error_message:
+        click.echo(f"Error: {result.error_message}")
+    
+    if result.metadata:
+        click.echo("\nMetadata:")
+        click.echo(f"  Author: {result.metadata.author_name}")
+        if result.metadata.author_email:
+            click.echo(f"  Email: {result.metadata.author_email}")
+        if result.metadata.author_organization:
+            click.echo(f"  Organization: {result.metadata.author_organization}")
+        click.echo(f"  Timestamp: {result.metadata.timestamp.isoformat()}")
+        click.echo(f"  Public key fingerprint: {result.metadata.pubkey_fingerprint}")
+        if result.metadata.pubkey_url:
+            click.echo(f"  Public key URL: {result.metadata.pubkey_url}")
+        if result.metadata.embedded_pubkey:
+            click.echo("  Public key: Embedded in metadata")
+        if result.metadata.tags:
+            click.echo(f"  Tags: {', '.join(result.metadata.tags)}")
+        if result.metadata.notes:
+            click.echo(f"  Notes: {result.metadata.notes}")
+
+
 if __name__ == '__main__':
     main()
@@ -2,17 +2,88 @@
 Core cryptographic services for the AVCF system.
 """
 
-import json
-import hashlib
 import gnupg
+import hashlib
 import tempfile
 import os
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Tuple, Union
+from typing import Optional, Dict, Any, BinaryIO, Iterator, List, Sequence, Tuple, Union
 from datetime import datetime
 
 from .models import AVCFMetadata, SignedAVCFBlock, SignatureStatus, VerificationResult
 from ..infra.exceptions import AVCFCryptoError
+from ..infra.hashing import (
+    DEFAULT_HASH_SCHEME,
+    HASH_SCHEME_SHA256,
+    HASH_SCHEME_SHA256_STREAMS,
+    SIGNING_HASH_SCHEMES,
+    hash_file_object_sha256,
+    hash_video_sha256,
+    hash_video_streams,
+)
+
+
+# Maximum number of signature check outcomes cached per CryptoService
+SIGNATURE_CACHE_SIZE = 4096
+
+# Maximum number of video hashes cached per CryptoService
+HASH_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=None)
+def find_gpg_binary() -> str:
+    """
+    Find the GnuPG binary on the PATH.
+    
+    The lookup is done once per process.
+    
+    Returns:
+        Path to the gpg binary, or "gpg" if it is not on the PATH.
+    """
+    return shutil.which("gpg") or "gpg"
+
+
+@contextmanager
+def signature_file(data: bytes) -> Iterator[str]:
+    """
+    Provide data at a path that GnuPG can read, for the duration of the context.
+    
+    On Linux the data is kept in an anonymous in-memory file and exposed through
+    /proc, so nothing is written to or removed from the filesystem. Elsewhere a
+    temporary file is used.
+    
+    Args:
+        data: Contents of the file.
+    
+    Yields:
+        Path of the file.
+    """
+    proc_fd_dir = f"/proc/{os.getpid()}/fd"
+    if hasattr(os, 'memfd_create') and os.path.isdir(proc_fd_dir):
+        fd = os.memfd_create("avcf-signature", os.MFD_CLOEXEC)
+        try:
+            os.write(fd, data)
+            yield f"{proc_fd_dir}/{fd}"
+        finally:
+            os.close(fd)
+        return
+    
+    # Create a temporary file for the signature
+    with tempfile.NamedTemporaryFile(delete=False) as sig_file:
+        sig_file.write(data)
+        sig_file_path = sig_file.name
+    
+    try:
+        yield sig_file_path
+    finally:
+        # Clean up temporary file
+        os.unlink(sig_file_path)
 
 
 class CryptoService:
@@ -26,42 +97,144 @@ class CryptoService:
             gnupg_home: Path to the GnuPG home directory. If None, a temporary directory will be used.
         """
         if gnupg_home is None:
+            # TemporaryDirectory removes itself when garbage collected or at exit if
+            # close() is never called
             self._temp_dir = tempfile.TemporaryDirectory()
             gnupg_home = Path(self._temp_dir.name)
         else:
             self._temp_dir = None
             
-        self.gpg = gnupg.GPG(gnupghome=str(gnupg_home))
+        self.gpg = gnupg.GPG(gpgbinary=find_gpg_binary(), gnupghome=str(gnupg_home))
+        
+        # Public keys by fingerprint and key ID and signature check outcomes, both reset on key import
+        self._keys_by_id: Optional[Dict[str, Dict[str, Any]]] = None
+        self._signature_cache: "OrderedDict[bytes, bool]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        
+        # Video hashes by path, file identity and hash scheme
+        self._hash_cache: "OrderedDict[Tuple[Any, ...], str]" = OrderedDict()
     
-    def __del__(self):
-        """Clean up temporary directory if one was created."""
+    def close(self) -> None:
+        """Remove the temporary GnuPG home directory, if one was created."""
         if self._temp_dir is not None:
             self._temp_dir.cleanup()
+            self._temp_dir = None
+    
+    def __enter__(self) -> 'CryptoService':
+        return self
     
-    def calculate_video_hash(self, video_path: Path) -> str:
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+    
+    def calculate_video_hash(self, video: Union[Path, bytes, bytearray, memoryview, BinaryIO]) -> str:
         """
         Calculate SHA-256 hash of video content.
         
         Args:
-            video_path: Path to the video file.
+            video: Path to the video file, the video content, or a binary file object
+                to read it from.
             
         Returns:
             SHA-256 hash of the video content.
             
         Raises:
-            AVCFCryptoError: If the video file cannot be read.
+            AVCFCryptoError: If the video cannot be read.
+        """
+        # In-memory content and open files are hashed directly, without the hash cache
+        if isinstance(video, (bytes, bytearray, memoryview)):
+            return hashlib.sha256(video).hexdigest()
+        if hasattr(video, 'readinto'):
+            try:
+                return hash_file_object_sha256(video)
+            except Exception as e:
+                raise AVCFCryptoError(f"Failed to calculate video hash: {e}")
+        
+        # This hashes the entire file, including container metadata, so embedding
+        # changes it. It is kept for blocks signed with the "sha256" scheme; new
+        # signatures hash just the audio/video streams (see hash_video).
+        return self.hash_video(video, HASH_SCHEME_SHA256)
+    
+    def hash_video(self, video_path: Path, hash_scheme: str = DEFAULT_HASH_SCHEME) -> str:
         """
+        Calculate the hash of a video using the given hash scheme.
+        
+        Args:
+            video_path: Path to the video file.
+            hash_scheme: Scheme to use, as recorded in AVCFMetadata.hash_scheme.
+            
+        Returns:
+            Hash of the video content.
+            
+        Raises:
+            AVCFCryptoError: If the scheme is not supported or the video file cannot be read.
+        """
+        # Reuse the hash if the file has not changed since it was last hashed. The change
+        # time is included because, unlike the modification time, it cannot be set back.
         try:
-            # In a real implementation, we would extract just the audio/video streams
-            # and exclude container metadata to avoid hash invalidation on metadata changes.
-            # For now, we'll hash the entire file as a placeholder.
-            sha256_hash = hashlib.sha256()
-            with open(video_path, "rb") as f:
-                for byte_block in iter(lambda: f.read(4096), b""):
-                    sha256_hash.update(byte_block)
-            return sha256_hash.hexdigest()
-        except Exception as e:
-            raise AVCFCryptoError(f"Failed to calculate video hash: {e}")
+            stat = os.stat(video_path)
+        except OSError:
+            cache_key = None
+        else:
+            cache_key = (os.path.abspath(video_path), stat.st_dev, stat.st_ino, stat.st_mtime_ns,
+                         stat.st_ctime_ns, stat.st_size, hash_scheme)
+            with self._cache_lock:
+                video_hash = self._hash_cache.get(cache_key)
+                if video_hash is not None:
+                    self._hash_cache.move_to_end(cache_key)
+                    return video_hash
+        
+        video_hash = self._compute_video_hash(video_path, hash_scheme)
+        
+        if cache_key is not None:
+            with self._cache_lock:
+                self._hash_cache[cache_key] = video_hash
+                if len(self._hash_cache) > HASH_CACHE_SIZE:
+                    self._hash_cache.popitem(last=False)
+        return video_hash
+    
+    def hash_videos(self, video_paths: Sequence[Path], hash_scheme: str = DEFAULT_HASH_SCHEME,
+                    max_workers: Optional[int] = None) -> List[str]:
+        """
+        Calculate the hashes of several videos concurrently.
+        
+        Files are hashed on a thread pool: hashlib releases the GIL while hashing and
+        stream hashing runs in FFmpeg subprocesses, so reads and hashing of different
+        files overlap.
+        
+        Args:
+            video_paths: Paths to the video files.
+            hash_scheme: Scheme to use, as recorded in AVCFMetadata.hash_scheme.
+            max_workers: Maximum number of files hashed at once. If None, the
+                ThreadPoolExecutor default is used.
+        
+        Returns:
+            Hashes of the videos, in the order of video_paths.
+        
+        Raises:
+            AVCFCryptoError: If the scheme is not supported or a video file cannot be read.
+        """
+        if len(video_paths) <= 1:
+            return [self.hash_video(video_path, hash_scheme) for video_path in video_paths]
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda video_path: self.hash_video(video_path, hash_scheme), video_paths))
+    
+    @staticmethod
+    def _compute_video_hash(video_path: Path, hash_scheme: str) -> str:
+        """Calculate the hash of a video without the hash cache (see hash_video)."""
+        if hash_scheme == HASH_SCHEME_SHA256:
+            try:
+                return hash_video_sha256(video_path)
+            except Exception as e:
+                raise AVCFCryptoError(f"Failed to calculate video hash: {e}")
+        
+        if hash_scheme == HASH_SCHEME_SHA256_STREAMS:
+            try:
+                return hash_video_streams(video_path)
+            except Exception as e:
+                raise AVCFCryptoError(f"Failed to calculate video hash: {e}")
+        
+        raise AVCFCryptoError(f"Unsupported hash scheme: {hash_scheme}")
     
     def create_metadata(self, 
                        video_path: Path, 
@@ -72,7 +245,8 @@ class CryptoService:
                        pubkey_url: Optional[str] = None,
                        embedded_pubkey: Optional[str] = None,
                        tags: Optional[list] = None,
-                       notes: Optional[str] = None) -> AVCFMetadata:
+                       notes: Optional[str] = None,
+                       hash_scheme: Optional[str] = None) -> AVCFMetadata:
         """
         Create AVCF metadata for a video.
         
@@ -86,14 +260,26 @@ class CryptoService:
             embedded_pubkey: Author's public key embedded directly.
             tags: Optional tags for categorization.
             notes: Optional notes about the content.
+            hash_scheme: Scheme used to hash the video. If None, the default scheme
+                (SHA-256 of the stream packets) is used.
             
         Returns:
             AVCF metadata.
+            
+        Raises:
+            AVCFCryptoError: If the hash scheme cannot be used for new signatures.
         """
-        video_hash = self.calculate_video_hash(video_path)
+        if hash_scheme is None:
+            hash_scheme = DEFAULT_HASH_SCHEME
+        if hash_scheme not in SIGNING_HASH_SCHEMES:
+            raise AVCFCryptoError(f"Hash scheme {hash_scheme!r} cannot be used for signing: "
+                                  f"embedding the signature changes the hashed file")
+        
+        video_hash = self.hash_video(video_path, hash_scheme)
         
         return AVCFMetadata(
             video_hash=video_hash,
+            hash_scheme=hash_scheme,
             author_name=author_name,
             author_email=author_email,
             author_organization=author_organization,
@@ -123,7 +309,7 @@ class CryptoService:
             AVCFCryptoError: If the metadata cannot be signed.
         """
         # Serialize metadata to JSON
-        metadata_json = metadata.model_dump_json()
+        metadata_json = metadata.canonical_json
         
         # Sign the serialized metadata
         signature = self.gpg.sign(metadata_json, 
@@ -154,16 +340,21 @@ class CryptoService:
             AVCFCryptoError: If the key cannot be imported.
         """
         result = self.gpg.import_keys(key_data)
+        self.invalidate_keys()
         if not result.fingerprints:
             raise AVCFCryptoError(f"Failed to import key: {result.stderr}")
         return result.fingerprints
     
-    def verify_signature(self, signed_block: SignedAVCFBlock) -> VerificationResult:
+    def verify_signature(self, signed_block: SignedAVCFBlock,
+                         video_hash: Optional[str] = None) -> VerificationResult:
         """
         Verify the signature of a signed AVCF block.
         
         Args:
             signed_block: Signed AVCF block.
+            video_hash: Hash of the video, calculated with the scheme named in the metadata.
+                If given, a valid signature is only reported as valid if the hash matches
+                the signed hash.
             
         Returns:
             Verification result.
@@ -173,19 +364,11 @@ class CryptoService:
         signature = signed_block.signature
         
         # Check if we have the public key
-        keys = self.gpg.list_keys()
-        key_found = False
-        for key in keys:
-            if metadata.pubkey_fingerprint in key['fingerprint']:
-                key_found = True
-                break
-        
-        if not key_found:
+        if not self._has_public_key(metadata.normalized_fingerprint):
             # If we have an embedded public key, import it
             if metadata.embedded_pubkey:
                 try:
                     self.import_key(metadata.embedded_pubkey)
-                    key_found = True
                 except AVCFCryptoError:
                     return VerificationResult(
                         status=SignatureStatus.KEY_NOT_FOUND,
@@ -200,18 +383,27 @@ class CryptoService:
                 )
         
         # Serialize metadata to JSON
-        metadata_json = metadata.model_dump_json()
-        
-        # Create a temporary file for the signature
-        with tempfile.NamedTemporaryFile(delete=False) as sig_file:
-            sig_file.write(signature.encode())
-            sig_file_path = sig_file.name
+        metadata_json = metadata.canonical_json
         
         try:
-            # Verify the signature
-            verified = self.gpg.verify_data(sig_file_path, metadata_json.encode())
+            # Verify the signature, unless this exact block was checked with the current keys
+            cache_key = self._signature_cache_key(metadata.pubkey_fingerprint, metadata_json, signature)
+            with self._cache_lock:
+                verified = self._signature_cache.get(cache_key)
+            if verified is None:
+                verified = self._verify_detached(signature, metadata_json)
+                with self._cache_lock:
+                    self._signature_cache[cache_key] = verified
+                    if len(self._signature_cache) > SIGNATURE_CACHE_SIZE:
+                        self._signature_cache.popitem(last=False)
             
-            if verified:
+            if verified and video_hash is not None and video_hash != metadata.video_hash:
+                return VerificationResult(
+                    status=SignatureStatus.INVALID,
+                    metadata=metadata,
+                    error_message="Video hash does not match the hash in the metadata"
+                )
+            elif verified:
                 return VerificationResult(
                     status=SignatureStatus.VALID,
                     metadata=metadata
@@ -228,9 +420,75 @@ class CryptoService:
                 metadata=metadata,
                 error_message=f"Error verifying signature: {e}"
             )
-        finally:
-            # Clean up temporary file
-            os.unlink(sig_file_path)
+    
+    def _verify_detached(self, signature: str, data: str) -> bool:
+        """
+        Check a detached signature over some data with GnuPG.
+        
+        Args:
+            signature: ASCII-armored detached signature.
+            data: Signed data.
+        
+        Returns:
+            True if the signature is valid, False otherwise.
+        """
+        with signature_file(signature.encode()) as sig_file_path:
+            return bool(self.gpg.verify_data(sig_file_path, data.encode()))
+    
+    @staticmethod
+    def _signature_cache_key(fingerprint: str, metadata_json: str, signature: str) -> bytes:
+        """Build the signature cache key for a fingerprint, signed metadata and signature."""
+        key = hashlib.sha256()
+        for part in (fingerprint, metadata_json, signature):
+            key.update(part.encode())
+            key.update(b"\0")
+        return key.digest()
+    
+    def get_keys(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the keys in the keyring, indexed by fingerprint and key ID.
+        
+        The key list is read from GnuPG once and cached until a key is imported or
+        invalidate_keys() is called. Services sharing this crypto service share the cache.
+        
+        Returns:
+            Dictionary mapping upper-case fingerprints, long key IDs and short key IDs to keys.
+        """
+        with self._cache_lock:
+            if self._keys_by_id is None:
+                keys = {}
+                for key in self.gpg.list_keys():
+                    keys[key['fingerprint'].upper()] = key
+                    keyid = key.get('keyid', '').upper()
+                    if keyid:
+                        keys[keyid] = key
+                        keys[keyid[-8:]] = key
+                self._keys_by_id = keys
+            return self._keys_by_id
+    
+    def invalidate_keys(self) -> None:
+        """Discard the cached key list and signature check outcomes, e.g. after the keyring changed."""
+        with self._cache_lock:
+            self._keys_by_id = None
+            self._signature_cache.clear()
+    
+    def _has_public_key(self, fingerprint: str) -> bool:
+        """
+        Check if the keyring has a public key with the given fingerprint.
+        
+        Args:
+            fingerprint: Fingerprint of the public key, without spaces and in upper case
+                (see AVCFMetadata.normalized_fingerprint).
+        
+        Returns:
+            True if the key is in the keyring, False otherwise.
+        """
+        keys = self.get_keys()
+        if fingerprint in keys:
+            return True
+        
+        # Fall back to a partial match, e.g. for a key ID
+        return any(fingerprint in key['fingerprint'] for key in keys.values())
     
     def verify_video_hash(self, video_path: Path, metadata: AVCFMetadata) -> bool:
         """
@@ -243,5 +501,5 @@ class CryptoService:
         Returns:
             True if the hash matches, False otherwise.
         """
-        calculated_hash = self.calculate_video_hash(video_path)
+        calculated_hash = self.hash_video(video_path, metadata.hash_scheme)
         return calculated_hash == metadata.video_hash
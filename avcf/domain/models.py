@@ -4,8 +4,9 @@ Core domain models for the AVCF system.
 
 from datetime import datetime
 from enum import Enum
-from typing import Optional, List
-from pydantic import BaseModel, Field, HttpUrl
+from functools import cached_property
+from typing import Optional, List, Dict, Any, Literal
+from pydantic import BaseModel, ConfigDict, Field, HttpUrl
 
 
 class SignatureStatus(Enum):
@@ -23,7 +24,9 @@ class AVCFMetadata(BaseModel):
     This is serialized to JSON and signed with the author's private key.
     """
     # Video content identification
-    video_hash: str = Field(..., description="SHA-256 hash of the video + audio stream")
+    video_hash: str = Field(..., description="Hash of the video content, calculated with hash_scheme",
+                            pattern=r"^[0-9a-fA-F]{64}$")
+    hash_scheme: Literal["sha256", "sha256-streams"] = Field("sha256", description="Scheme used to calculate the video hash")
     
     # Author identification
     author_name: str = Field(..., description="Name of the author or organization")
@@ -44,10 +47,40 @@ class AVCFMetadata(BaseModel):
     tags: Optional[List[str]] = Field(None, description="Optional tags for categorization")
     notes: Optional[str] = Field(None, description="Optional notes about the content")
     
-    class Config:
-        json_schema_extra = {
+    @cached_property
+    def canonical_json(self) -> str:
+        """
+        The JSON serialization of the metadata that is signed and verified.
+        
+        hash_scheme is omitted while it has its default, so metadata signed before the
+        field existed serializes exactly as it was signed. It is computed once per instance;
+        the model is frozen, so it never goes stale.
+        """
+        exclude = {'hash_scheme'} if self.hash_scheme == type(self).model_fields['hash_scheme'].default else None
+        return self.model_dump_json(exclude=exclude)
+    
+    @cached_property
+    def normalized_fingerprint(self) -> str:
+        """
+        The public key fingerprint without spaces and in upper case, as GnuPG lists it.
+        
+        pubkey_fingerprint itself is kept as signed, since it is part of the canonical JSON.
+        """
+        return self.pubkey_fingerprint.replace(' ', '').upper()
+    
+    def model_copy(self, *, update: Optional[Dict[str, Any]] = None, deep: bool = False) -> 'AVCFMetadata':
+        copied = super().model_copy(update=update, deep=deep)
+        # The copy inherits the cached values of the original, which are stale after an update
+        copied.__dict__.pop('canonical_json', None)
+        copied.__dict__.pop('normalized_fingerprint', None)
+        return copied
+    
+    model_config = ConfigDict(
+        frozen=True,
+        json_schema_extra={
             "example": {
                 "video_hash": "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
+                "hash_scheme": "sha256-streams",
                 "author_name": "Jane Doe",
                 "author_email": "jane@example.com",
                 "pubkey_fingerprint": "D4C9 D8F2 E1A1 D8BB 2F09 768A 5FBE 8F7B 07B4 328D",
@@ -57,6 +90,7 @@ class AVCFMetadata(BaseModel):
                 "tool_version": "0.1.0"
             }
         }
+    )
 
 
 class SignedAVCFBlock(BaseModel):
@@ -67,8 +101,9 @@ class SignedAVCFBlock(BaseModel):
     metadata: AVCFMetadata = Field(..., description="The AVCF metadata")
     signature: str = Field(..., description="PGP signature of the serialized metadata")
     
-    class Config:
-        json_schema_extra = {
+    model_config = ConfigDict(
+        frozen=True,
+        json_schema_extra={
             "example": {
                 "metadata": {
                     "video_hash": "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
@@ -83,10 +118,13 @@ class SignedAVCFBlock(BaseModel):
                 "signature": "-----BEGIN PGP SIGNATURE-----\n...\n-----END PGP SIGNATURE-----"
             }
         }
+    )
 
 
 class VerificationResult(BaseModel):
     """Result of verifying an AVCF signature."""
+    model_config = ConfigDict(frozen=True)
+    
     status: SignatureStatus
     metadata: Optional[AVCFMetadata] = None
     error_message: Optional[str] = None
@@ -3,19 +3,286 @@ Container format adapters for the AVCF system.
 """
 
 import json
+import shutil
 import subprocess
 import tempfile
 import os
-import shutil
+import xml.etree.ElementTree as ET
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Union, Dict, Any
+from typing import Optional, Dict, Any
 from abc import ABC, abstractmethod
 
 import ffmpeg
+from pydantic import ValidationError
 
 from ..domain.models import SignedAVCFBlock
 from .exceptions import AVCFContainerError
 
+try:
+    from mutagen import MutagenError
+    from mutagen.mp4 import MP4, MP4FreeForm, AtomDataType
+except ImportError:  # mutagen is an optional speedup
+    MP4 = None
+
+
+# Freeform MP4 atom holding the metadata when it is written without FFmpeg. FFmpeg,
+# and so the ffprobe fallback, reads it as the same 'avcf_auth' tag it writes itself.
+MP4_METADATA_ATOM = "----:com.apple.iTunes:avcf_auth"
+
+# Maximum number of ffprobe results cached per process
+PROBE_CACHE_SIZE = 128
+
+
+def _parse_metadata_json(metadata_json: str) -> SignedAVCFBlock:
+    """
+    Parse and validate an embedded metadata block in a single pass.
+    
+    Args:
+        metadata_json: Metadata JSON read from the container.
+    
+    Returns:
+        Parsed AVCF metadata block.
+    
+    Raises:
+        AVCFContainerError: If the metadata is not valid JSON.
+        ValidationError: If the metadata is not a valid AVCF metadata block.
+    """
+    try:
+        return SignedAVCFBlock.model_validate_json(metadata_json)
+    except ValidationError as e:
+        if any(error['type'] == 'json_invalid' for error in e.errors()):
+            raise AVCFContainerError(f"Failed to parse metadata JSON: {e}")
+        raise
+
+
+def _probe_tags(video_path: Path, tag_name: Optional[str], include_streams: bool = False) -> Dict[str, Any]:
+    """
+    Read only the AVCF metadata tag of a video with ffprobe.
+    
+    Unlike ffmpeg.probe, which asks for every format and stream field, only the
+    tag entries are requested, so ffprobe's output stays small for any file.
+    Results are cached per file identity, so probing an unchanged file again
+    does not run ffprobe; the returned dictionary must not be modified.
+    
+    Args:
+        video_path: Path to the video file.
+        tag_name: Name of the tag holding the metadata. If None, all tags are read.
+        include_streams: Whether to also read the tag from the streams.
+    
+    Returns:
+        Parsed ffprobe output, shaped like the output of ffmpeg.probe.
+    
+    Raises:
+        ffmpeg.Error: If ffprobe fails.
+        OSError: If the video file cannot be accessed.
+    """
+    file_stat = os.stat(video_path)
+    return _probe_tags_cached(os.path.abspath(video_path), tag_name, include_streams,
+                              file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+
+
+@lru_cache(maxsize=PROBE_CACHE_SIZE)
+def _probe_tags_cached(video_path: str, tag_name: Optional[str], include_streams: bool,
+                       inode: int, mtime_ns: int, size: int) -> Dict[str, Any]:
+    """Run ffprobe for _probe_tags; the file identity arguments only key the cache."""
+    entries = "format_tags" if tag_name is None else f"format_tags={tag_name}"
+    if include_streams:
+        entries += ":stream_tags" if tag_name is None else f":stream_tags={tag_name}"
+    
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', entries, '-of', 'json', video_path],
+        capture_output=True
+    )
+    if result.returncode != 0:
+        raise ffmpeg.Error('ffprobe', result.stdout, result.stderr)
+    return json.loads(result.stdout)
+
+
+def _find_avcf_tag(probe: Dict[str, Any], tag_name: str, include_streams: bool = False) -> Optional[str]:
+    """
+    Find the AVCF metadata tag in ffprobe output.
+    
+    Args:
+        probe: Parsed ffprobe output.
+        tag_name: Name of the tag holding the metadata.
+        include_streams: Whether to look in the stream tags before the format tags.
+    
+    Returns:
+        Metadata JSON, or None if the tag is not present.
+    """
+    if include_streams:
+        for stream in probe.get('streams', []):
+            tags = stream.get('tags', {})
+            if tag_name in tags:
+                return tags[tag_name]
+    
+    return probe.get('format', {}).get('tags', {}).get(tag_name)
+
+
+def _read_mp4_atom(video_path: Path) -> Optional[str]:
+    """
+    Read the AVCF metadata atom of an MP4 file with mutagen.
+    
+    Only the atom tree is parsed, the media data is not read.
+    
+    Args:
+        video_path: Path to the MP4 file.
+    
+    Returns:
+        Metadata JSON, or None if mutagen is not installed, the file cannot be parsed
+        or it has no AVCF metadata atom.
+    """
+    if MP4 is None:
+        return None
+    try:
+        tags = MP4(str(video_path)).tags
+    except MutagenError:
+        return None
+    values = tags.get(MP4_METADATA_ATOM) if tags is not None else None
+    if not values:
+        return None
+    return bytes(values[0]).decode('utf-8')
+
+
+def _write_mp4_atom(input_path: Path, output_path: Path, metadata_json: str) -> bool:
+    """
+    Write the AVCF metadata atom into a copy of an MP4 file with mutagen.
+    
+    The output is a byte copy of the input (made by the kernel where possible) with
+    the atom added in place, instead of a full remux.
+    
+    Args:
+        input_path: Path to the input MP4 file.
+        output_path: Path to the output MP4 file. May be the input path.
+        metadata_json: Metadata JSON to embed.
+    
+    Returns:
+        True if the atom was written, False if mutagen is not installed or cannot
+        handle the file.
+    
+    Raises:
+        AVCFContainerError: If the input file cannot be copied.
+    """
+    if MP4 is None:
+        return False
+    try:
+        # Parse the input first so that files mutagen cannot handle are not copied
+        MP4(str(input_path))
+    except MutagenError:
+        return False
+    
+    try:
+        if Path(input_path).resolve() != Path(output_path).resolve():
+            shutil.copyfile(input_path, output_path)
+    except OSError as e:
+        raise AVCFContainerError(f"Failed to copy MP4 file: {e}")
+    
+    try:
+        mp4 = MP4(str(output_path))
+        if mp4.tags is None:
+            mp4.add_tags()
+        mp4.tags[MP4_METADATA_ATOM] = [MP4FreeForm(metadata_json.encode('utf-8'), dataformat=AtomDataType.UTF8)]
+        mp4.save()
+    except MutagenError:
+        return False
+    return True
+
+
+def _write_matroska_tags(input_path: Path, output_path: Path, metadata_json: str) -> bool:
+    """
+    Write the AVCF metadata tag into a copy of a Matroska file with mkvpropedit.
+    
+    mkvpropedit rewrites only the tag elements in place, instead of a full remux.
+    It replaces all global tags, so the existing ones are read with ffprobe and
+    written back alongside the AVCF tag.
+    
+    Args:
+        input_path: Path to the input Matroska file.
+        output_path: Path to the output Matroska file. May be the input path.
+        metadata_json: Metadata JSON to embed.
+    
+    Returns:
+        True if the tag was written, False if mkvpropedit is not installed or
+        cannot handle the file.
+    
+    Raises:
+        AVCFContainerError: If the input file cannot be copied.
+    """
+    mkvpropedit = shutil.which('mkvpropedit')
+    if mkvpropedit is None:
+        return False
+    try:
+        global_tags = _probe_tags(input_path, None).get('format', {}).get('tags', {})
+    except (ffmpeg.Error, OSError, ValueError):
+        return False
+    global_tags = {name: value for name, value in global_tags.items() if name.upper() != 'AVCF_AUTH'}
+    global_tags['AVCF_AUTH'] = metadata_json
+    
+    # Build the Matroska tags XML with all global tags
+    tags = ET.Element('Tags')
+    tag = ET.SubElement(tags, 'Tag')
+    ET.SubElement(tag, 'Targets')
+    for name, value in global_tags.items():
+        simple = ET.SubElement(tag, 'Simple')
+        ET.SubElement(simple, 'Name').text = name
+        ET.SubElement(simple, 'String').text = value
+    
+    try:
+        if Path(input_path).resolve() != Path(output_path).resolve():
+            shutil.copyfile(input_path, output_path)
+    except OSError as e:
+        raise AVCFContainerError(f"Failed to copy Matroska file: {e}")
+    
+    with tempfile.NamedTemporaryFile(suffix='.xml', delete=False) as tags_file:
+        ET.ElementTree(tags).write(tags_file, encoding='utf-8', xml_declaration=True)
+        tags_file_path = tags_file.name
+    
+    try:
+        result = subprocess.run([mkvpropedit, '--quiet', str(output_path), '--tags', f'global:{tags_file_path}'],
+                                capture_output=True)
+    finally:
+        os.unlink(tags_file_path)
+    # mkvpropedit exits with 1 for warnings and 2 for errors
+    return result.returncode in (0, 1)
+
+
+def _remux_with_metadata(input_path: Path, output_path: Path, **output_kwargs) -> None:
+    """
+    Copy the streams of a video into a new file with FFmpeg.
+    
+    FFmpeg cannot write the file it reads, so when the output is the input, the
+    streams are written to a temporary file next to it that then replaces it.
+    
+    Args:
+        input_path: Path to the input video file.
+        output_path: Path to the output video file. May be the input path.
+        **output_kwargs: FFmpeg output arguments.
+    
+    Raises:
+        ffmpeg.Error: If FFmpeg fails.
+    """
+    target_path = Path(output_path)
+    in_place = Path(input_path).resolve() == target_path.resolve()
+    if in_place:
+        with tempfile.NamedTemporaryFile(suffix=target_path.suffix, dir=target_path.parent,
+                                         delete=False) as temp_file:
+            target_path = Path(temp_file.name)
+    
+    try:
+        (
+            ffmpeg
+            .input(str(input_path))
+            .output(str(target_path), **output_kwargs)
+            .global_args('-y')  # Overwrite output file if it exists
+            .run(quiet=True, overwrite_output=True)
+        )
+        if in_place:
+            os.replace(target_path, output_path)
+    finally:
+        if in_place:
+            target_path.unlink(missing_ok=True)
+
 
 class ContainerAdapter(ABC):
     """Base class for container format adapters."""
@@ -27,7 +294,8 @@ class ContainerAdapter(ABC):
         
         Args:
             input_path: Path to the input video file.
-            output_path: Path to the output video file.
+            output_path: Path to the output video file. May be the input path, in which
+                case the metadata is embedded in place.
             metadata_block: Signed AVCF metadata block to embed.
             
         Raises:
@@ -61,40 +329,32 @@ class MP4Adapter(ContainerAdapter):
         
         Args:
             input_path: Path to the input MP4 file.
-            output_path: Path to the output MP4 file.
+            output_path: Path to the output MP4 file. May be the input path.
             metadata_block: Signed AVCF metadata block to embed.
             
         Raises:
             AVCFContainerError: If the metadata cannot be embedded.
         """
         # Serialize the metadata block to JSON
-        metadata_json = json.dumps(metadata_block.model_dump())
+        metadata_json = metadata_block.model_dump_json()
         
-        # Create a temporary file for the metadata
-        with tempfile.NamedTemporaryFile(suffix='.txt', delete=False) as metadata_file:
-            metadata_file.write(metadata_json.encode())
-            metadata_file_path = metadata_file.name
+        # Add the atom directly when mutagen is available, without remuxing the file
+        if _write_mp4_atom(input_path, output_path, metadata_json):
+            return
         
         try:
-            # Use ffmpeg to embed the metadata in the 'udta' atom with custom tag 'avcf'
-            # This uses the -metadata:s:v key=value syntax to add metadata to the video stream
-            (
-                ffmpeg
-                .input(str(input_path))
-                .output(
-                    str(output_path),
-                    metadata_file=metadata_file_path,
-                    metadata="avcf_auth={}".format(metadata_json.replace('"', '\\"')),
-                    c='copy'  # Copy streams without re-encoding
-                )
-                .global_args('-y')  # Overwrite output file if it exists
-                .run(quiet=True, overwrite_output=True)
+            # Use ffmpeg to embed the metadata as a custom 'avcf_auth' tag in the 'udta' atom.
+            # The value is passed as a single argument without a shell, so it needs no escaping;
+            # use_metadata_tags makes the MP4 muxer keep tags it does not know.
+            _remux_with_metadata(
+                input_path,
+                output_path,
+                metadata=f"avcf_auth={metadata_json}",
+                movflags='use_metadata_tags',
+                c='copy'  # Copy streams without re-encoding
             )
         except ffmpeg.Error as e:
             raise AVCFContainerError(f"Failed to embed metadata in MP4 file: {e.stderr.decode() if e.stderr else str(e)}")
-        finally:
-            # Clean up temporary file
-            os.unlink(metadata_file_path)
     
     def extract_metadata(self, video_path: Path) -> Optional[SignedAVCFBlock]:
         """
@@ -110,29 +370,23 @@ class MP4Adapter(ContainerAdapter):
             AVCFContainerError: If the metadata cannot be extracted.
         """
         try:
-            # Use ffprobe to extract metadata
-            probe = ffmpeg.probe(str(video_path))
+            # Read the atom directly when mutagen is available
+            metadata_json = _read_mp4_atom(video_path)
+            if metadata_json is not None:
+                return _parse_metadata_json(metadata_json)
             
-            # Look for avcf_auth metadata in format tags
-            for stream in probe.get('streams', []):
-                tags = stream.get('tags', {})
-                if 'avcf_auth' in tags:
-                    metadata_json = tags['avcf_auth']
-                    metadata_dict = json.loads(metadata_json)
-                    return SignedAVCFBlock.model_validate(metadata_dict)
-            
-            # Look for avcf_auth metadata in format tags (top level)
-            format_tags = probe.get('format', {}).get('tags', {})
-            if 'avcf_auth' in format_tags:
-                metadata_json = format_tags['avcf_auth']
-                metadata_dict = json.loads(metadata_json)
-                return SignedAVCFBlock.model_validate(metadata_dict)
+            # Use ffprobe to extract metadata
+            probe = _probe_tags(video_path, 'avcf_auth', include_streams=True)
             
-            return None
+            # Look for avcf_auth metadata in stream tags, then in format tags (top level)
+            metadata_json = _find_avcf_tag(probe, 'avcf_auth', include_streams=True)
+            if metadata_json is None:
+                return None
+            return _parse_metadata_json(metadata_json)
         except ffmpeg.Error as e:
             raise AVCFContainerError(f"Failed to extract metadata from MP4 file: {e.stderr.decode() if e.stderr else str(e)}")
-        except json.JSONDecodeError as e:
-            raise AVCFContainerError(f"Failed to parse metadata JSON: {e}")
+        except AVCFContainerError:
+            raise
         except Exception as e:
             raise AVCFContainerError(f"Failed to extract metadata: {e}")
 
@@ -146,27 +400,26 @@ class MKVAdapter(ContainerAdapter):
         
         Args:
             input_path: Path to the input MKV file.
-            output_path: Path to the output MKV file.
+            output_path: Path to the output MKV file. May be the input path.
             metadata_block: Signed AVCF metadata block to embed.
             
         Raises:
             AVCFContainerError: If the metadata cannot be embedded.
         """
         # Serialize the metadata block to JSON
-        metadata_json = json.dumps(metadata_block.model_dump())
+        metadata_json = metadata_block.model_dump_json()
+        
+        # Edit the tags in place when mkvpropedit is available, without remuxing the file
+        if _write_matroska_tags(input_path, output_path, metadata_json):
+            return
         
         try:
-            # Use ffmpeg to embed the metadata as a custom tag
-            (
-                ffmpeg
-                .input(str(input_path))
-                .output(
-                    str(output_path),
-                    metadata="AVCF_AUTH={}".format(metadata_json.replace('"', '\\"')),
-                    c='copy'  # Copy streams without re-encoding
-                )
-                .global_args('-y')  # Overwrite output file if it exists
-                .run(quiet=True, overwrite_output=True)
+            # Use ffmpeg to embed the metadata as a custom tag; the value needs no escaping
+            _remux_with_metadata(
+                input_path,
+                output_path,
+                metadata=f"AVCF_AUTH={metadata_json}",
+                c='copy'  # Copy streams without re-encoding
             )
         except ffmpeg.Error as e:
             raise AVCFContainerError(f"Failed to embed metadata in MKV file: {e.stderr.decode() if e.stderr else str(e)}")
@@ -186,20 +439,17 @@ class MKVAdapter(ContainerAdapter):
         """
         try:
             # Use ffprobe to extract metadata
-            probe = ffmpeg.probe(str(video_path))
+            probe = _probe_tags(video_path, 'AVCF_AUTH')
             
             # Look for AVCF_AUTH metadata in format tags
-            format_tags = probe.get('format', {}).get('tags', {})
-            if 'AVCF_AUTH' in format_tags:
-                metadata_json = format_tags['AVCF_AUTH']
-                metadata_dict = json.loads(metadata_json)
-                return SignedAVCFBlock.model_validate(metadata_dict)
-            
-            return None
+            metadata_json = _find_avcf_tag(probe, 'AVCF_AUTH')
+            if metadata_json is None:
+                return None
+            return _parse_metadata_json(metadata_json)
         except ffmpeg.Error as e:
             raise AVCFContainerError(f"Failed to extract metadata from MKV file: {e.stderr.decode() if e.stderr else str(e)}")
-        except json.JSONDecodeError as e:
-            raise AVCFContainerError(f"Failed to parse metadata JSON: {e}")
+        except AVCFContainerError:
+            raise
         except Exception as e:
             raise AVCFContainerError(f"Failed to extract metadata: {e}")
 
@@ -207,21 +457,24 @@ class MKVAdapter(ContainerAdapter):
 class WebMAdapter(ContainerAdapter):
     """Adapter for WebM container format."""
     
+    def __init__(self):
+        """Initialize the WebM adapter."""
+        # WebM is based on Matroska, so we can use the same approach as MKV
+        self._mkv_adapter = MKVAdapter()
+    
     def embed_metadata(self, input_path: Path, output_path: Path, metadata_block: SignedAVCFBlock) -> None:
         """
         Embed AVCF metadata into a WebM file.
         
         Args:
             input_path: Path to the input WebM file.
-            output_path: Path to the output WebM file.
+            output_path: Path to the output WebM file. May be the input path.
             metadata_block: Signed AVCF metadata block to embed.
             
         Raises:
             AVCFContainerError: If the metadata cannot be embedded.
         """
-        # WebM is based on Matroska, so we can use the same approach as MKV
-        mkv_adapter = MKVAdapter()
-        mkv_adapter.embed_metadata(input_path, output_path, metadata_block)
+        self._mkv_adapter.embed_metadata(input_path, output_path, metadata_block)
     
     def extract_metadata(self, video_path: Path) -> Optional[SignedAVCFBlock]:
         """
@@ -236,9 +489,16 @@ class WebMAdapter(ContainerAdapter):
         Raises:
             AVCFContainerError: If the metadata cannot be extracted.
         """
-        # WebM is based on Matroska, so we can use the same approach as MKV
-        mkv_adapter = MKVAdapter()
-        return mkv_adapter.extract_metadata(video_path)
+        return self._mkv_adapter.extract_metadata(video_path)
+
+
+# Container adapter for each supported file suffix. Adapters are stateless, so one
+# instance of each is shared.
+ADAPTERS_BY_SUFFIX: Dict[str, ContainerAdapter] = {
+    '.mp4': MP4Adapter(),
+    '.mkv': MKVAdapter(),
+    '.webm': WebMAdapter(),
+}
 
 
 class ContainerFactory:
@@ -247,7 +507,7 @@ class ContainerFactory:
     @staticmethod
     def create_adapter(file_path: Path) -> ContainerAdapter:
         """
-        Create a container adapter for the given file.
+        Get the container adapter for the given file.
         
         Args:
             file_path: Path to the video file.
@@ -260,11 +520,7 @@ class ContainerFactory:
         """
         suffix = file_path.suffix.lower()
         
-        if suffix == '.mp4':
-            return MP4Adapter()
-        elif suffix == '.mkv':
-            return MKVAdapter()
-        elif suffix == '.webm':
-            return WebMAdapter()
-        else:
+        adapter = ADAPTERS_BY_SUFFIX.get(suffix)
+        if adapter is None:
             raise AVCFContainerError(f"Unsupported container format: {suffix}")
+        return adapter
@@ -6,21 +6,55 @@ with existing video workflows.
 """
 
 import os
-import tempfile
 import subprocess
+import tempfile
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, Dict, Any, FrozenSet
 
 import ffmpeg
 
 from ..app.services import SigningService
-from ..domain.models import SignedAVCFBlock
 from ..infra.exceptions import AVCFError
+from ..infra.hashing import HASH_SCHEME_SHA256_STREAMS
+
+
+# Hardware H.264 encoders that accept frames from system memory, in order of preference
+_HARDWARE_H264_ENCODERS = ('h264_nvenc', 'h264_videotoolbox')
+
+# Marker for keys that are missing from argument dictionaries
+_MISSING = object()
+
+
+@lru_cache(maxsize=None)
+def _stream_methods(stream_type: type) -> FrozenSet[str]:
+    """
+    Get the names of the public methods of an ffmpeg-python stream type.
+    
+    Args:
+        stream_type: Type of the stream.
+    
+    Returns:
+        Names of the methods that FFmpeg arguments can be applied with.
+    """
+    return frozenset(
+        name for name in dir(stream_type)
+        if not name.startswith('_') and callable(getattr(stream_type, name, None))
+    )
 
 
 class FFmpegWrapper:
     """Wrapper around FFmpeg for AVCF integration."""
     
+    # Stream methods for the argument keys that hold filters, looked up once per key;
+    # output arguments have no method
+    _FILTER_METHODS = {
+        'filters': 'filter',
+        'audio_filters': 'filter_audio',
+        'video_filters': 'filter_video',
+        'output_args': None,
+    }
+    
     def __init__(self, signing_service: Optional[SigningService] = None, gnupg_home: Optional[Path] = None):
         """
         Initialize the FFmpeg wrapper.
@@ -29,8 +63,21 @@ class FFmpegWrapper:
             signing_service: Signing service to use. If None, a new one will be created.
             gnupg_home: Path to the GnuPG home directory. If None, a temporary directory will be used.
         """
+        # Only a signing service created here is closed with the wrapper
+        self._owns_signing_service = signing_service is None
         self.signing_service = signing_service or SigningService(gnupg_home)
     
+    def close(self) -> None:
+        """Release the resources held by the wrapper."""
+        if self._owns_signing_service:
+            self.signing_service.close()
+    
+    def __enter__(self) -> 'FFmpegWrapper':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+    
     def process_and_sign(self, 
                         input_path: Path, 
                         output_path: Path, 
@@ -47,6 +94,9 @@ class FFmpegWrapper:
         """
         Process a video with FFmpeg and sign it with AVCF metadata.
         
+        FFmpeg writes the processed video to a temporary file next to the output. That file
+        is hashed and signed in place once FFmpeg has finished, then renamed to the output.
+        
         Args:
             input_path: Path to the input video file.
             output_path: Path to the output video file.
@@ -67,31 +117,68 @@ class FFmpegWrapper:
         Raises:
             AVCFError: If the video cannot be processed or signed.
         """
-        # Create a temporary file for the processed video
-        with tempfile.NamedTemporaryFile(suffix=output_path.suffix, delete=False) as temp_file:
+        output_path = Path(output_path)
+        
+        # A plain stream copy into the same container only rewrites the file, so skip FFmpeg
+        # and sign the input directly; the container adapter copies it to the output
+        if self._requests_no_processing(input_path, output_path, ffmpeg_args):
+            try:
+                self._sign_processed_video(
+                    input_path, output_path, key_id, author_name,
+                    author_email, author_organization, pubkey_url,
+                    embed_pubkey, passphrase, tags, notes
+                )
+            except Exception as e:
+                raise AVCFError(f"Failed to process and sign video: {e}")
+            return output_path
+        
+        # Create a temporary file for the processed video next to the output, so that
+        # it can be signed in place and then renamed to the output without a copy
+        with tempfile.NamedTemporaryFile(suffix=output_path.suffix, dir=output_path.parent,
+                                         delete=False) as temp_file:
             temp_path = Path(temp_file.name)
         
         try:
             # Process the video with FFmpeg
             self._process_video_with_ffmpeg(input_path, temp_path, ffmpeg_args)
             
-            # Sign the processed video
+            # Sign the processed video in place; its stream hash is read from the finished file
             self._sign_processed_video(
-                temp_path, output_path, key_id, author_name,
+                temp_path, temp_path, key_id, author_name,
                 author_email, author_organization, pubkey_url,
                 embed_pubkey, passphrase, tags, notes
             )
             
+            os.replace(temp_path, output_path)
             return output_path
         except ffmpeg.Error as e:
             raise AVCFError(f"Failed to process video with FFmpeg: {e.stderr.decode() if e.stderr else str(e)}")
         except Exception as e:
             raise AVCFError(f"Failed to process and sign video: {e}")
         finally:
-            # Clean up temporary file
-            if temp_path.exists():
-                os.unlink(temp_path)
+            # Clean up temporary file; it is already gone if it was renamed to the output
+            temp_path.unlink(missing_ok=True)
                 
+    @staticmethod
+    def _requests_no_processing(input_path: Path, output_path: Path,
+                                ffmpeg_args: Optional[Dict[str, Any]]) -> bool:
+        """
+        Check whether FFmpeg would only copy the streams into the same container format.
+        
+        Returns:
+            True if all filter and stream arguments are empty, the only output argument is
+            the default stream copy and the output has the input's file suffix.
+        """
+        if Path(input_path).suffix.lower() != Path(output_path).suffix.lower():
+            return False
+        for key, value in (ffmpeg_args or {}).items():
+            if key == 'output_args':
+                if value and value != {'c': 'copy'}:
+                    return False
+            elif value:
+                return False
+        return True
+    
     def _process_video_with_ffmpeg(self, input_path: Path, output_path: Path, 
                                   ffmpeg_args: Optional[Dict[str, Any]]) -> None:
         """Process a video with FFmpeg using the provided arguments."""
@@ -119,53 +206,30 @@ class FFmpegWrapper:
     
     def _apply_ffmpeg_arg(self, stream, key: str, value):
         """Apply a single FFmpeg argument to the stream."""
-        if key == 'filters':
-            stream = self._apply_filters(stream, value)
-        elif key == 'audio_filters':
-            stream = self._apply_audio_filters(stream, value)
-        elif key == 'video_filters':
-            stream = self._apply_video_filters(stream, value)
-        elif key == 'output_args':
+        filter_method = self._FILTER_METHODS.get(key, _MISSING)
+        if filter_method is _MISSING:
+            return self._apply_method(stream, key, value)
+        if filter_method is None:
             # These will be applied directly to the output
-            pass
-        else:
-            stream = self._apply_method(stream, key, value)
-        
-        return stream
-    
-    def _apply_filters(self, stream, filters):
-        """Apply general filters to the stream."""
-        if isinstance(filters, list):
-            for filter_arg in filters:
-                stream = stream.filter(**filter_arg)
-        else:
-            stream = stream.filter(**filters)
-        return stream
-    
-    def _apply_audio_filters(self, stream, filters):
-        """Apply audio filters to the stream."""
-        if isinstance(filters, list):
-            for filter_arg in filters:
-                stream = stream.filter_audio(**filter_arg)
-        else:
-            stream = stream.filter_audio(**filters)
-        return stream
+            return stream
+        return self._apply_filters(stream, value, filter_method)
     
-    def _apply_video_filters(self, stream, filters):
-        """Apply video filters to the stream."""
-        if isinstance(filters, list):
-            for filter_arg in filters:
-                stream = stream.filter_video(**filter_arg)
-        else:
-            stream = stream.filter_video(**filters)
+    @staticmethod
+    def _apply_filters(stream, filters, method_name: str):
+        """Apply a filter or a list of filters to the stream with the given stream method."""
+        if not isinstance(filters, list):
+            # A single filter, the common case
+            return getattr(stream, method_name)(**filters)
+        for filter_arg in filters:
+            stream = getattr(stream, method_name)(**filter_arg)
         return stream
     
     def _apply_method(self, stream, method_name: str, value):
         """Apply a method to the stream."""
-        method = getattr(stream, method_name, None)
-        if not method or not callable(method):
+        if method_name not in _stream_methods(type(stream)):
             return stream
-            
+        method = getattr(stream, method_name)
+        
         if isinstance(value, dict):
             return method(**value)
         elif isinstance(value, list):
@@ -194,9 +258,42 @@ class FFmpegWrapper:
             embed_pubkey=embed_pubkey,
             passphrase=passphrase,
             tags=tags,
-            notes=notes
+            notes=notes,
+            hash_scheme=HASH_SCHEME_SHA256_STREAMS
         )
     
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def hardware_h264_encoder() -> Optional[str]:
+        """
+        Find a hardware H.264 encoder that works on this machine.
+        
+        FFmpeg lists encoders that are compiled in even when no matching GPU is present,
+        so each listed encoder is checked with a short test encode. The result is cached
+        for the life of the process.
+        
+        Returns:
+            Name of the FFmpeg encoder to use with 'c:v', or None if no hardware encoder
+            is available and a software encoder such as libx264 should be used.
+        """
+        try:
+            result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], capture_output=True, text=True)
+        except OSError:
+            return None
+        listed = {line.split()[1] for line in result.stdout.splitlines() if len(line.split()) > 1}
+        
+        for encoder in _HARDWARE_H264_ENCODERS:
+            if encoder not in listed:
+                continue
+            probe = subprocess.run(
+                ['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'color=s=256x256:d=0.1',
+                 '-c:v', encoder, '-f', 'null', '-'],
+                capture_output=True
+            )
+            if probe.returncode == 0:
+                return encoder
+        return None
+    
     @staticmethod
     def create_filter_complex(filter_string: str) -> Dict[str, Any]:
         """
@@ -265,44 +362,22 @@ class FFmpegWrapper:
         
         for arg in args:
             for key, value in arg.items():
-                result = FFmpegWrapper._merge_arg_value(result, key, value)
+                existing = result.get(key, _MISSING)
+                if existing is _MISSING:
+                    # Add new key
+                    result[key] = value
+                elif isinstance(existing, list):
+                    if isinstance(value, list):
+                        existing.extend(value)
+                    else:
+                        existing.append(value)
+                elif isinstance(existing, dict):
+                    if not isinstance(value, dict):
+                        # Can't merge dict with non-dict
+                        raise AVCFError(f"Cannot merge {key} arguments of different types")
+                    existing.update(value)
+                else:
+                    # Convert to list
+                    result[key] = [existing, value]
         
         return result
-    
-    @staticmethod
-    def _merge_arg_value(result: Dict[str, Any], key: str, value: Any) -> Dict[str, Any]:
-        """Merge a new argument value with existing arguments."""
-        if key not in result:
-            # Add new key
-            result[key] = value
-            return result
-            
-        # Key exists, need to merge
-        if isinstance(result[key], list):
-            result = FFmpegWrapper._merge_with_list(result, key, value)
-        elif isinstance(result[key], dict):
-            result = FFmpegWrapper._merge_with_dict(result, key, value)
-        else:
-            # Convert to list
-            result[key] = [result[key], value]
-            
-        return result
-    
-    @staticmethod
-    def _merge_with_list(result: Dict[str, Any], key: str, value: Any) -> Dict[str, Any]:
-        """Merge a value with an existing list value."""
-        if isinstance(value, list):
-            result[key].extend(value)
-        else:
-            result[key].append(value)
-        return result
-    
-    @staticmethod
-    def _merge_with_dict(result: Dict[str, Any], key: str, value: Any) -> Dict[str, Any]:
-        """Merge a value with an existing dict value."""
-        if isinstance(value, dict):
-            result[key].update(value)
-        else:
-            # Can't merge dict with non-dict
-            raise AVCFError(f"Cannot merge {key} arguments of different types")
-        return result
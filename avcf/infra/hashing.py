@@ -0,0 +1,152 @@
+"""
+Video hashing helpers for the AVCF system.
+"""
+
+import hashlib
+import mmap
+import os
+import stat
+import subprocess
+from pathlib import Path
+from typing import BinaryIO
+
+
+# Identifiers for the schemes used to calculate AVCFMetadata.video_hash
+HASH_SCHEME_SHA256 = "sha256"
+HASH_SCHEME_SHA256_STREAMS = "sha256-streams"
+
+# Scheme used for new signatures
+DEFAULT_HASH_SCHEME = HASH_SCHEME_SHA256_STREAMS
+
+# Schemes accepted for new signatures; the whole-file scheme is only verified,
+# since embedding the signed block changes the file it hashes
+SIGNING_HASH_SCHEMES = (HASH_SCHEME_SHA256_STREAMS,)
+
+# Read buffer size for files that cannot be memory-mapped (1 MiB)
+READ_BUFFER_SIZE = 1 << 20
+
+# hashlib.file_digest is only available on Python 3.11+
+_file_digest = getattr(hashlib, "file_digest", None)
+
+
+def _advise_sequential(fd: int, size: int) -> None:
+    """Tell the kernel the file will be read sequentially, where supported."""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, 0, size, os.POSIX_FADV_SEQUENTIAL)
+            os.posix_fadvise(fd, 0, size, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            # Advice is only a hint; some filesystems do not support it
+            pass
+
+
+def _hash_file(f: BinaryIO, hasher: "hashlib._Hash") -> None:
+    """Feed everything readable from a binary file object into a hash through one reused buffer."""
+    buffer = bytearray(READ_BUFFER_SIZE)
+    view = memoryview(buffer)
+    while True:
+        n = f.readinto(buffer)
+        if not n:
+            break
+        hasher.update(view[:n])
+
+
+def _hash_stream(fd: int, hasher: "hashlib._Hash") -> None:
+    """Feed everything readable from a file descriptor into a hash through one reused buffer."""
+    with open(fd, 'rb', buffering=0, closefd=False) as f:
+        if _file_digest is not None:
+            # Python 3.11+ runs the read loop in C
+            _file_digest(f, lambda: hasher)
+        else:
+            _hash_file(f, hasher)
+
+
+def hash_file_object_sha256(f: BinaryIO) -> str:
+    """
+    Calculate the SHA-256 hash of everything readable from a binary file object.
+    
+    Args:
+        f: Binary file object supporting readinto, such as an open file or io.BytesIO.
+    
+    Returns:
+        Hex-encoded SHA-256 hash of the data.
+    
+    Raises:
+        OSError: If the file object cannot be read.
+    """
+    hasher = hashlib.sha256()
+    _hash_file(f, hasher)
+    return hasher.hexdigest()
+
+
+def hash_video_sha256(video_path: Path) -> str:
+    """
+    Calculate the SHA-256 hash of a whole video file.
+    
+    The file is memory-mapped and hashed in a single call rather than copied
+    through a read buffer. Files that cannot be mapped, such as pipes, are read
+    through a single reused buffer instead.
+    
+    Args:
+        video_path: Path to the video file.
+    
+    Returns:
+        Hex-encoded SHA-256 hash of the file.
+    
+    Raises:
+        OSError: If the video file cannot be read.
+    """
+    fd = os.open(video_path, os.O_RDONLY)
+    try:
+        file_stat = os.fstat(fd)
+        size = file_stat.st_size
+        if stat.S_ISREG(file_stat.st_mode):
+            if size == 0:
+                # mmap cannot map an empty file
+                return hashlib.sha256(b"").hexdigest()
+            
+            _advise_sequential(fd, size)
+            try:
+                with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                    return hashlib.sha256(mm).hexdigest()
+            except (OSError, ValueError):
+                # Some filesystems do not support mapping; read the file instead
+                os.lseek(fd, 0, os.SEEK_SET)
+        
+        hasher = hashlib.sha256()
+        _hash_stream(fd, hasher)
+        return hasher.hexdigest()
+    finally:
+        os.close(fd)
+
+
+def hash_video_streams(video_path: Path) -> str:
+    """
+    Calculate the SHA-256 hash of the audio and video packets of a video file.
+    
+    The packets are hashed by FFmpeg's hash muxer without decoding, so the hash
+    does not depend on the container format or its metadata. Embedding the
+    AVCF block, or remuxing into another container, leaves the hash unchanged.
+    
+    Args:
+        video_path: Path to the video file.
+    
+    Returns:
+        Hex-encoded SHA-256 hash of the stream packets.
+    
+    Raises:
+        OSError: If FFmpeg cannot be run or fails to read the video file.
+    """
+    result = subprocess.run(
+        ["ffmpeg", "-v", "error", "-nostdin", "-i", str(video_path),
+         "-map", "0:v?", "-map", "0:a?", "-c", "copy",
+         "-f", "hash", "-hash", "sha256", "-"],
+        capture_output=True,
+        text=True
+    )
+    
+    output = result.stdout.strip()
+    if result.returncode != 0 or not output.startswith("SHA256="):
+        raise OSError(f"FFmpeg failed to hash the streams of {video_path}: {result.stderr.strip()}")
+    
+    return output[len("SHA256="):]
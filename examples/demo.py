@@ -10,11 +10,13 @@ This script demonstrates the complete workflow of the AVCF system:
 5. Tamper with the video and show detection
 """
 
+import mmap
 import os
 import sys
 import tempfile
 import subprocess
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import json
 
@@ -52,7 +54,7 @@ def generate_test_key(gnupg_home, name=DEMO_AUTHOR_NAME, email=DEMO_AUTHOR_EMAIL
     %commit
     """
     
-    result = subprocess.run(cmd, input=key_config.encode(), capture_output=True)
+    result = subprocess.run(cmd, input=key_config.encode(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
     if result.returncode != 0:
         print(f"Error generating key: {result.stderr.decode()}")
         sys.exit(1)
@@ -60,7 +62,7 @@ def generate_test_key(gnupg_home, name=DEMO_AUTHOR_NAME, email=DEMO_AUTHOR_EMAIL
     # Get the key fingerprint
     result = subprocess.run(
         ["gpg", "--homedir", gnupg_home, "--list-secret-keys", "--with-colons"],
-        capture_output=True, text=True
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
     )
     
     for line in result.stdout.splitlines():
@@ -76,26 +78,24 @@ def create_test_video(output_path):
     """Create a simple test video file using FFmpeg."""
     print(f"Creating test video at {output_path}...")
     
-    # Create a 5-second test video with text
+    # Create a 5-second test video with text; only errors are written to stderr
     cmd = [
-        "ffmpeg", "-y", "-f", "lavfi", "-i", "color=c=blue:s=1280x720:d=5", 
+        "ffmpeg", "-v", "error", "-nostats", "-y", "-f", "lavfi", "-i", "color=c=blue:s=1280x720:d=5", 
         "-vf", "drawtext=text='AVCF Demo Video':fontcolor=white:fontsize=60:x=(w-text_w)/2:y=(h-text_h)/2",
         "-c:v", "libx264", "-tune", "stillimage", "-pix_fmt", "yuv420p",
         str(output_path)
     ]
     
-    result = subprocess.run(cmd, capture_output=True)
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
     if result.returncode != 0:
         print(f"Error creating test video: {result.stderr.decode()}")
         sys.exit(1)
 
 
-def sign_video(input_path, output_path, key_id, gnupg_home):
+def sign_video(input_path, output_path, key_id, signing_service):
     """Sign a video with AVCF metadata."""
     print(f"Signing video {input_path} -> {output_path}...")
     
-    signing_service = SigningService(gnupg_home=Path(gnupg_home))
-    
     signing_service.sign_video(
         input_path=input_path,
         output_path=output_path,
@@ -109,11 +109,10 @@ def sign_video(input_path, output_path, key_id, gnupg_home):
     )
 
 
-def verify_video(video_path, gnupg_home):
+def verify_video(video_path, verification_service):
     """Verify a signed video and print the results."""
     print(f"Verifying video {video_path}...")
     
-    verification_service = VerificationService(gnupg_home=Path(gnupg_home))
     result = verification_service.verify_video(video_path)
     
     print("\nVerification Results:")
@@ -142,21 +141,25 @@ def tamper_with_video(input_path, output_path):
     # Copy the file
     shutil.copy2(input_path, output_path)
     
-    # Modify a few bytes in the middle of the file
-    with open(output_path, "r+b") as f:
-        # Seek to a position in the middle of the file
-        f.seek(int(os.path.getsize(output_path) / 2))
-        # Write some bytes
-        f.write(b"TAMPERED")
+    # Modify a few bytes in the middle of the file through a memory map
+    with open(output_path, "r+b") as f, mmap.mmap(f.fileno(), 0) as mm:
+        middle = len(mm) // 2
+        mm[middle:middle + len(b"TAMPERED")] = b"TAMPERED"
 
 
-def process_with_ffmpeg(input_path, output_path, key_id, gnupg_home):
+def process_with_ffmpeg(input_path, output_path, key_id, signing_service):
     """Process a video with FFmpeg and sign it."""
     print(f"Processing and signing video {input_path} -> {output_path}...")
     
-    signing_service = SigningService(gnupg_home=Path(gnupg_home))
     ffmpeg_wrapper = FFmpegWrapper(signing_service)
     
+    # Encode on the GPU when a hardware encoder works, otherwise with libx264
+    hardware_encoder = FFmpegWrapper.hardware_h264_encoder()
+    if hardware_encoder is not None:
+        output_args = {"c:v": hardware_encoder}
+    else:
+        output_args = {"c:v": "libx264", "crf": "23"}
+    
     ffmpeg_wrapper.process_and_sign(
         input_path=input_path,
         output_path=output_path,
@@ -171,10 +174,7 @@ def process_with_ffmpeg(input_path, output_path, key_id, gnupg_home):
             "video_filters": {
                 "scale": "640:360"  # Resize to 640x360
             },
-            "output_args": {
-                "c:v": "libx264",
-                "crf": "23"
-            }
+            "output_args": output_args
         }
     )
 
@@ -197,22 +197,29 @@ def main():
         tampered_video = Path(temp_dir) / "tampered.mp4"
         processed_video = Path(temp_dir) / "processed.mp4"
         
-        # Generate a test key
-        key_id = generate_test_key(gnupg_home)
+        # Generate a test key and create a test video at the same time; both wait on
+        # a subprocess, and neither uses the other's output
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            key_future = executor.submit(generate_test_key, gnupg_home)
+            video_future = executor.submit(create_test_video, original_video)
+            key_id = key_future.result()
+            video_future.result()
         print(f"Generated key with ID: {key_id}")
         
-        # Create a test video
-        create_test_video(original_video)
+        # Share one signing and one verification service, and so one GnuPG context,
+        # across all steps
+        signing_service = SigningService(gnupg_home=Path(gnupg_home))
+        verification_service = VerificationService(gnupg_home=Path(gnupg_home))
         
         print("\n" + "=" * 80)
         print("1. Basic Signing and Verification")
         print("=" * 80)
         
         # Sign the video
-        sign_video(original_video, signed_video, key_id, gnupg_home)
+        sign_video(original_video, signed_video, key_id, signing_service)
         
         # Verify the signed video
-        status = verify_video(signed_video, gnupg_home)
+        status = verify_video(signed_video, verification_service)
         assert status == SignatureStatus.VALID, "Verification failed"
         
         print("\n" + "=" * 80)
@@ -223,7 +230,7 @@ def main():
         tamper_with_video(signed_video, tampered_video)
         
         # Verify the tampered video
-        status = verify_video(tampered_video, gnupg_home)
+        status = verify_video(tampered_video, verification_service)
         assert status == SignatureStatus.INVALID, "Tamper detection failed"
         
         print("\n" + "=" * 80)
@@ -231,10 +238,10 @@ def main():
         print("=" * 80)
         
         # Process and sign with FFmpeg
-        process_with_ffmpeg(original_video, processed_video, key_id, gnupg_home)
+        process_with_ffmpeg(original_video, processed_video, key_id, signing_service)
         
         # Verify the processed video
-        status = verify_video(processed_video, gnupg_home)
+        status = verify_video(processed_video, verification_service)
         assert status == SignatureStatus.VALID, "Verification of processed video failed"
         
         print("\n" + "=" * 80)
@@ -4,12 +4,15 @@ Unit tests for the AVCF container adapters.
 
 import unittest
 import tempfile
-import os
 import json
+import shutil
+import subprocess
+import xml.etree.ElementTree as ET
 from pathlib import Path
 from unittest.mock import patch, MagicMock
 
 from avcf.domain.models import AVCFMetadata, SignedAVCFBlock
+from avcf.infra import container
 from avcf.infra.container import MP4Adapter, MKVAdapter, WebMAdapter, ContainerFactory
 from avcf.infra.exceptions import AVCFContainerError
 
@@ -17,30 +20,19 @@ from avcf.infra.exceptions import AVCFContainerError
 class TestContainerAdapters(unittest.TestCase):
     """Test cases for AVCF container adapters."""
     
-    def setUp(self):
-        """Set up test environment."""
-        # Create temporary files
-        self.mp4_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-        self.mp4_file.write(b'test mp4 content')
-        self.mp4_file.close()
-        self.mp4_path = Path(self.mp4_file.name)
-        
-        self.mkv_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mkv')
-        self.mkv_file.write(b'test mkv content')
-        self.mkv_file.close()
-        self.mkv_path = Path(self.mkv_file.name)
-        
-        self.webm_file = tempfile.NamedTemporaryFile(delete=False, suffix='.webm')
-        self.webm_file.write(b'test webm content')
-        self.webm_file.close()
-        self.webm_path = Path(self.webm_file.name)
-        
-        self.output_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-        self.output_file.close()
-        self.output_path = Path(self.output_file.name)
+    @classmethod
+    def setUpClass(cls):
+        """Set up the files and metadata shared by all tests."""
+        # Create the test files once in a temporary directory
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        temp_path = Path(cls.temp_dir.name)
+        cls.mp4_path = temp_path / 'input.mp4'
+        cls.mkv_path = temp_path / 'input.mkv'
+        cls.webm_path = temp_path / 'input.webm'
+        cls.output_path = temp_path / 'output.mp4'
         
         # Create test metadata
-        self.metadata = AVCFMetadata(
+        cls.metadata = AVCFMetadata(
             video_hash="e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
             author_name="Test Author",
             pubkey_fingerprint="D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D",
@@ -49,18 +41,22 @@ class TestContainerAdapters(unittest.TestCase):
         )
         
         # Create signed block
-        self.signed_block = SignedAVCFBlock(
-            metadata=self.metadata,
+        cls.signed_block = SignedAVCFBlock(
+            metadata=cls.metadata,
             signature="-----BEGIN PGP SIGNATURE-----\nTest Signature\n-----END PGP SIGNATURE-----"
         )
     
-    def tearDown(self):
-        """Clean up test environment."""
-        # Remove temporary files
-        os.unlink(self.mp4_path)
-        os.unlink(self.mkv_path)
-        os.unlink(self.webm_path)
-        os.unlink(self.output_path)
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up the shared files."""
+        cls.temp_dir.cleanup()
+    
+    def setUp(self):
+        """Reset the test files, which some tests overwrite."""
+        self.mp4_path.write_bytes(b'test mp4 content')
+        self.mkv_path.write_bytes(b'test mkv content')
+        self.webm_path.write_bytes(b'test webm content')
+        self.output_path.write_bytes(b'')
     
     @patch('ffmpeg.input')
     def test_mp4_adapter_embed_metadata(self, mock_input):
@@ -79,13 +75,19 @@ class TestContainerAdapters(unittest.TestCase):
         mock_input.assert_called_once_with(str(self.mp4_path))
         mock_input.return_value.output.assert_called_once()
         mock_output.global_args.assert_called_once_with('-y')
+        
+        # Check that the metadata is passed unescaped and kept by the MP4 muxer
+        output_kwargs = mock_input.return_value.output.call_args.kwargs
+        self.assertEqual(output_kwargs['movflags'], 'use_metadata_tags')
+        self.assertEqual(json.loads(output_kwargs['metadata'].split('=', 1)[1])['signature'],
+                         self.signed_block.signature)
         mock_output.global_args.return_value.run.assert_called_once()
     
-    @patch('ffmpeg.probe')
+    @patch('avcf.infra.container._probe_tags')
     def test_mp4_adapter_extract_metadata(self, mock_probe):
         """Test extracting metadata from MP4 file."""
-        # Mock ffmpeg probe
-        metadata_json = json.dumps(self.signed_block.model_dump())
+        # Mock ffprobe
+        metadata_json = self.signed_block.model_dump_json()
         mock_probe.return_value = {
             'format': {
                 'tags': {
@@ -101,7 +103,7 @@ class TestContainerAdapters(unittest.TestCase):
         extracted_block = adapter.extract_metadata(self.mp4_path)
         
         # Check that ffmpeg was called correctly
-        mock_probe.assert_called_once_with(str(self.mp4_path))
+        mock_probe.assert_called_once_with(self.mp4_path, 'avcf_auth', include_streams=True)
         
         # Check extracted metadata
         self.assertIsNotNone(extracted_block)
@@ -109,11 +111,11 @@ class TestContainerAdapters(unittest.TestCase):
         self.assertEqual(extracted_block.metadata.video_hash, "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855")
         self.assertEqual(extracted_block.signature, "-----BEGIN PGP SIGNATURE-----\nTest Signature\n-----END PGP SIGNATURE-----")
     
-    @patch('ffmpeg.probe')
+    @patch('avcf.infra.container._probe_tags')
     def test_mp4_adapter_extract_metadata_from_stream(self, mock_probe):
         """Test extracting metadata from MP4 file stream tags."""
-        # Mock ffmpeg probe
-        metadata_json = json.dumps(self.signed_block.model_dump())
+        # Mock ffprobe
+        metadata_json = self.signed_block.model_dump_json()
         mock_probe.return_value = {
             'streams': [
                 {
@@ -131,16 +133,16 @@ class TestContainerAdapters(unittest.TestCase):
         extracted_block = adapter.extract_metadata(self.mp4_path)
         
         # Check that ffmpeg was called correctly
-        mock_probe.assert_called_once_with(str(self.mp4_path))
+        mock_probe.assert_called_once_with(self.mp4_path, 'avcf_auth', include_streams=True)
         
         # Check extracted metadata
         self.assertIsNotNone(extracted_block)
         self.assertEqual(extracted_block.metadata.author_name, "Test Author")
     
-    @patch('ffmpeg.probe')
+    @patch('avcf.infra.container._probe_tags')
     def test_mp4_adapter_extract_metadata_missing(self, mock_probe):
         """Test extracting missing metadata from MP4 file."""
-        # Mock ffmpeg probe
+        # Mock ffprobe
         mock_probe.return_value = {
             'format': {
                 'tags': {}
@@ -154,11 +156,73 @@ class TestContainerAdapters(unittest.TestCase):
         extracted_block = adapter.extract_metadata(self.mp4_path)
         
         # Check that ffmpeg was called correctly
-        mock_probe.assert_called_once_with(str(self.mp4_path))
+        mock_probe.assert_called_once_with(self.mp4_path, 'avcf_auth', include_streams=True)
         
         # Check that no metadata was extracted
         self.assertIsNone(extracted_block)
     
+    @patch('avcf.infra.container._probe_tags')
+    def test_mp4_adapter_extract_metadata_invalid(self, mock_probe):
+        """Test extracting metadata that is not valid JSON from MP4 file."""
+        # Mock ffprobe
+        mock_probe.return_value = {
+            'format': {
+                'tags': {
+                    'avcf_auth': '{"metadata": '
+                }
+            }
+        }
+        
+        # Create adapter
+        adapter = MP4Adapter()
+        
+        # Check that the JSON error is reported
+        with self.assertRaisesRegex(AVCFContainerError, "^Failed to parse metadata JSON"):
+            adapter.extract_metadata(self.mp4_path)
+    
+    @patch('avcf.infra.container.subprocess.run')
+    def test_probe_tags(self, mock_run):
+        """Test that only the AVCF tags are requested from ffprobe."""
+        container._probe_tags_cached.cache_clear()
+        mock_run.return_value.returncode = 0
+        mock_run.return_value.stdout = b'{"streams": [], "format": {"tags": {"avcf_auth": "{}"}}}'
+        
+        # Probe the tags
+        probe = container._probe_tags(self.mp4_path, 'avcf_auth', include_streams=True)
+        
+        # Check that ffprobe was called correctly
+        self.assertEqual(mock_run.call_args.args[0],
+                         ['ffprobe', '-v', 'error', '-show_entries', 'format_tags=avcf_auth:stream_tags=avcf_auth',
+                          '-of', 'json', str(self.mp4_path)])
+        self.assertEqual(probe['format']['tags']['avcf_auth'], '{}')
+        
+        # Check that an unchanged file is not probed again
+        self.assertIs(container._probe_tags(self.mp4_path, 'avcf_auth', include_streams=True), probe)
+        self.assertEqual(mock_run.call_count, 1)
+        
+        # Check that ffprobe failures are reported
+        container._probe_tags_cached.cache_clear()
+        mock_run.return_value.returncode = 1
+        mock_run.return_value.stderr = b'Invalid data found when processing input'
+        with self.assertRaisesRegex(AVCFContainerError, "Invalid data found"):
+            MP4Adapter().extract_metadata(self.mp4_path)
+    
+    @unittest.skipUnless(container.MP4 is not None and shutil.which('ffmpeg'), "mutagen or ffmpeg is not installed")
+    def test_mp4_metadata_atom(self):
+        """Test writing and reading the MP4 metadata atom without FFmpeg."""
+        # Create a short test video
+        subprocess.run(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i', 'testsrc=duration=1:size=64x48:rate=5',
+                        '-c:v', 'mpeg4', str(self.mp4_path)], check=True)
+        
+        # Write the atom into a copy and read it back
+        self.assertTrue(container._write_mp4_atom(self.mp4_path, self.output_path, '{"test": "\\"}'))
+        self.assertEqual(container._read_mp4_atom(self.output_path), '{"test": "\\"}')
+        self.assertIsNone(container._read_mp4_atom(self.mp4_path))
+        
+        # Check that files that are not MP4 are left to FFmpeg
+        self.assertFalse(container._write_mp4_atom(self.mkv_path, self.output_path, '{}'))
+        self.assertIsNone(container._read_mp4_atom(self.mkv_path))
+    
     @patch('ffmpeg.input')
     def test_mkv_adapter_embed_metadata(self, mock_input):
         """Test embedding metadata in MKV file."""
@@ -178,11 +242,28 @@ class TestContainerAdapters(unittest.TestCase):
         mock_output.global_args.assert_called_once_with('-y')
         mock_output.global_args.return_value.run.assert_called_once()
     
-    @patch('ffmpeg.probe')
+    @patch('avcf.infra.container.shutil.which')
+    @patch('ffmpeg.input')
+    def test_mkv_adapter_embed_metadata_same_path(self, mock_input, mock_which):
+        """Test embedding metadata with FFmpeg into the input file itself."""
+        mock_which.return_value = None
+        
+        # Embed metadata in place
+        MKVAdapter().embed_metadata(self.mkv_path, self.mkv_path, self.signed_block)
+        
+        # Check that FFmpeg wrote a temporary file next to the input, which replaced it
+        temp_path = Path(mock_input.return_value.output.call_args.args[0])
+        self.assertNotEqual(temp_path, self.mkv_path)
+        self.assertEqual(temp_path.parent, self.mkv_path.parent)
+        self.assertEqual(temp_path.suffix, '.mkv')
+        self.assertFalse(temp_path.exists())
+        self.assertTrue(self.mkv_path.exists())
+    
+    @patch('avcf.infra.container._probe_tags')
     def test_mkv_adapter_extract_metadata(self, mock_probe):
         """Test extracting metadata from MKV file."""
-        # Mock ffmpeg probe
-        metadata_json = json.dumps(self.signed_block.model_dump())
+        # Mock ffprobe
+        metadata_json = self.signed_block.model_dump_json()
         mock_probe.return_value = {
             'format': {
                 'tags': {
@@ -198,12 +279,42 @@ class TestContainerAdapters(unittest.TestCase):
         extracted_block = adapter.extract_metadata(self.mkv_path)
         
         # Check that ffmpeg was called correctly
-        mock_probe.assert_called_once_with(str(self.mkv_path))
+        mock_probe.assert_called_once_with(self.mkv_path, 'AVCF_AUTH')
         
         # Check extracted metadata
         self.assertIsNotNone(extracted_block)
         self.assertEqual(extracted_block.metadata.author_name, "Test Author")
     
+    @patch('avcf.infra.container.subprocess.run')
+    @patch('avcf.infra.container._probe_tags')
+    @patch('avcf.infra.container.shutil.which')
+    def test_mkv_adapter_embed_metadata_in_place(self, mock_which, mock_probe, mock_run):
+        """Test embedding metadata in MKV file with mkvpropedit."""
+        mock_which.return_value = '/usr/bin/mkvpropedit'
+        mock_probe.return_value = {'format': {'tags': {'TITLE': 'Test <title>', 'AVCF_AUTH': 'old'}}}
+        
+        # Capture the tags file passed to mkvpropedit
+        written_tags = {}
+        
+        def run_mkvpropedit(args, **kwargs):
+            tags_file_path = args[-1].split(':', 1)[1]
+            root = ET.parse(tags_file_path).getroot()
+            for simple in root.iter('Simple'):
+                written_tags[simple.findtext('Name')] = simple.findtext('String')
+            return MagicMock(returncode=0)
+        
+        mock_run.side_effect = run_mkvpropedit
+        
+        # Embed metadata
+        with patch('ffmpeg.input') as mock_input:
+            MKVAdapter().embed_metadata(self.mkv_path, self.output_path, self.signed_block)
+        
+        # Check that the file was edited in place instead of remuxed
+        mock_input.assert_not_called()
+        self.assertEqual(mock_run.call_args.args[0][:3], ['/usr/bin/mkvpropedit', '--quiet', str(self.output_path)])
+        self.assertEqual(self.output_path.read_bytes(), b'test mkv content')
+        self.assertEqual(written_tags, {'TITLE': 'Test <title>', 'AVCF_AUTH': self.signed_block.model_dump_json()})
+    
     def test_container_factory(self):
         """Test container factory."""
         # Create adapters for different file types
@@ -216,6 +327,9 @@ class TestContainerAdapters(unittest.TestCase):
         self.assertIsInstance(mkv_adapter, MKVAdapter)
         self.assertIsInstance(webm_adapter, WebMAdapter)
         
+        # Check that adapters are shared
+        self.assertIs(ContainerFactory.create_adapter(Path('other.MP4')), mp4_adapter)
+        
         # Check unsupported format
         with self.assertRaises(AVCFContainerError):
             ContainerFactory.create_adapter(Path('test.txt'))
@@ -3,58 +3,117 @@ Unit tests for the AVCF cryptographic services.
 """
 
 import unittest
+import io
 import tempfile
 import os
 import json
+import hashlib
+import shutil
+import subprocess
+import time
 from pathlib import Path
 from unittest.mock import patch, MagicMock
 
-from avcf.domain.crypto import CryptoService
+from avcf.domain.crypto import CryptoService, signature_file
 from avcf.domain.models import AVCFMetadata, SignedAVCFBlock, SignatureStatus
 from avcf.infra.exceptions import AVCFCryptoError
+from avcf.infra.hashing import (
+    HASH_SCHEME_SHA256,
+    HASH_SCHEME_SHA256_STREAMS,
+    hash_video_sha256,
+)
+
+
+# SHA-256 of the test video content, b'test video content'
+EXPECTED_TEST_HASH = 'b8e219804f9ca63b0cf1d1422176fa55838d065ac80f710e8aa1e985bf7c11fc'
+
+# Fingerprint of the key that signs the test metadata
+TEST_FINGERPRINT = 'D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D'
+
+
+class _StubGPG:
+    """Minimal stand-in for gnupg.GPG in signature verification tests."""
+    
+    def __init__(self, verify: bool, fingerprint: str):
+        self._verify = verify
+        self._keys = [{'fingerprint': fingerprint}]
+    
+    def verify_data(self, *args):
+        return self._verify
+    
+    def list_keys(self):
+        return self._keys
 
 
 class TestCryptoService(unittest.TestCase):
     """Test cases for AVCF cryptographic services."""
     
+    @classmethod
+    def setUpClass(cls):
+        """Set up the GnuPG home and test video shared by all tests."""
+        # Create one temporary directory for the GnuPG home and the test video; GPG is
+        # mocked, so no test changes the keyring
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.gnupg_home = Path(cls.temp_dir.name) / 'gnupg'
+        cls.gnupg_home.mkdir(mode=0o700)
+        
+        # Create the test video path once
+        cls.video_path = Path(cls.temp_dir.name) / 'video.mp4'
+        
+        # Mock GPG for all tests, so no test starts the gpg binary
+        cls._gpg_patcher = patch('gnupg.GPG')
+        cls.mock_gpg_class = cls._gpg_patcher.start()
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up the shared files and stop mocking GPG."""
+        cls._gpg_patcher.stop()
+        cls.temp_dir.cleanup()
+    
+    def _crypto_service_with(self, gpg):
+        """Create a crypto service that uses the given GPG object."""
+        self.mock_gpg_class.return_value = gpg
+        return CryptoService(self.gnupg_home)
+    
     def setUp(self):
         """Set up test environment."""
-        # Create a temporary directory for GnuPG home
-        self.temp_dir = tempfile.TemporaryDirectory()
-        self.gnupg_home = Path(self.temp_dir.name)
-        
-        # Create a crypto service
+        # Create a crypto service with a fresh GPG mock
+        self.mock_gpg = MagicMock()
+        self.mock_gpg_class.return_value = self.mock_gpg
         self.crypto_service = CryptoService(self.gnupg_home)
         
-        # Create a temporary video file
-        self.video_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-        self.video_file.write(b'test video content')
-        self.video_file.close()
-        self.video_path = Path(self.video_file.name)
+        # Reset the test video, which some tests change
+        self.video_path.write_bytes(b'test video content')
     
-    def tearDown(self):
-        """Clean up test environment."""
-        # Remove temporary files
-        os.unlink(self.video_path)
-        
-        # Clean up temporary directory
-        self.temp_dir.cleanup()
+    def test_close(self):
+        """Test that closing a crypto service removes its temporary GnuPG home."""
+        with CryptoService() as crypto_service:
+            gnupg_home = self.mock_gpg_class.call_args.kwargs['gnupghome']
+            self.assertTrue(os.path.isdir(gnupg_home))
+        
+        self.assertFalse(os.path.exists(gnupg_home))
+        crypto_service.close()
+        
+        # A GnuPG home passed in is not removed
+        self.crypto_service.close()
+        self.assertTrue(self.gnupg_home.is_dir())
     
     def test_calculate_video_hash(self):
         """Test calculating video hash."""
-        # Calculate hash
-        hash_value = self.crypto_service.calculate_video_hash(self.video_path)
+        # Check that hash is the SHA-256 of the content
+        self.assertEqual(self.crypto_service.calculate_video_hash(self.video_path), EXPECTED_TEST_HASH)
         
-        # Check that hash is a valid SHA-256 hash
-        self.assertEqual(len(hash_value), 64)
-        self.assertTrue(all(c in '0123456789abcdef' for c in hash_value))
-        
-        # Check that hash is consistent
-        hash_value2 = self.crypto_service.calculate_video_hash(self.video_path)
-        self.assertEqual(hash_value, hash_value2)
+        # Check that in-memory content and file objects hash like the file
+        self.assertEqual(self.crypto_service.calculate_video_hash(b'test video content'), EXPECTED_TEST_HASH)
+        self.assertEqual(self.crypto_service.calculate_video_hash(io.BytesIO(b'test video content')),
+                         EXPECTED_TEST_HASH)
     
-    def test_create_metadata(self):
+    @patch('avcf.domain.crypto.hash_video_streams')
+    def test_create_metadata(self, mock_hash_video_streams):
         """Test creating AVCF metadata."""
+        # Mock stream hashing (the test file is not a real video)
+        mock_hash_video_streams.return_value = hashlib.sha256(b'streams').hexdigest()
+        
         # Create metadata
         metadata = self.crypto_service.create_metadata(
             video_path=self.video_path,
@@ -71,19 +130,122 @@ class TestCryptoService(unittest.TestCase):
         # Check that video hash is present
         self.assertIsNotNone(metadata.video_hash)
         self.assertEqual(len(metadata.video_hash), 64)
+        self.assertEqual(metadata.hash_scheme, HASH_SCHEME_SHA256_STREAMS)
+        self.assertEqual(metadata.video_hash, mock_hash_video_streams.return_value)
+        self.assertTrue(self.crypto_service.verify_video_hash(self.video_path, metadata))
+        mock_hash_video_streams.assert_called_with(self.video_path)
+        
+        # The whole-file scheme is invalidated by embedding the signature, so it cannot sign
+        with self.assertRaises(AVCFCryptoError):
+            self.crypto_service.create_metadata(
+                video_path=self.video_path,
+                author_name="Test Author",
+                pubkey_fingerprint="D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D",
+                hash_scheme=HASH_SCHEME_SHA256
+            )
+    
+    @unittest.skipUnless(shutil.which('ffmpeg'), "ffmpeg is not installed")
+    def test_hash_video_streams(self):
+        """Test that the stream hash survives remuxing with metadata."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Create a short test video and remux it with metadata into another container
+            original_path = Path(temp_dir) / 'original.mp4'
+            remuxed_path = Path(temp_dir) / 'remuxed.mkv'
+            subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc=duration=1:size=64x48:rate=5',
+                            '-c:v', 'mpeg4', str(original_path)], check=True)
+            subprocess.run(['ffmpeg', '-v', 'error', '-i', str(original_path), '-c', 'copy',
+                            '-metadata', 'AVCF=test', str(remuxed_path)], check=True)
+            
+            # Check that the container hashes differ but the stream hashes match
+            self.assertNotEqual(self.crypto_service.hash_video(original_path, HASH_SCHEME_SHA256),
+                                self.crypto_service.hash_video(remuxed_path, HASH_SCHEME_SHA256))
+            self.assertEqual(self.crypto_service.hash_video(original_path, HASH_SCHEME_SHA256_STREAMS),
+                             self.crypto_service.hash_video(remuxed_path, HASH_SCHEME_SHA256_STREAMS))
+        
+        # Check that a file that is not a video cannot be hashed
+        with self.assertRaises(AVCFCryptoError):
+            self.crypto_service.hash_video(self.video_path, HASH_SCHEME_SHA256_STREAMS)
+    
+    @unittest.skipUnless(os.path.isdir('/proc/self/fd'), "/proc is not available")
+    def test_hash_video_sha256_pipe(self):
+        """Test hashing a file that cannot be memory-mapped."""
+        read_fd, write_fd = os.pipe()
+        try:
+            os.write(write_fd, b'test video content')
+            os.close(write_fd)
+            self.assertEqual(hash_video_sha256(Path(f'/proc/self/fd/{read_fd}')),
+                             hashlib.sha256(b'test video content').hexdigest())
+        finally:
+            os.close(read_fd)
+    
+    def test_hash_video_sha256(self):
+        """Test calculating a whole-file video hash."""
+        # Check that the scheme is the SHA-256 of the whole file
+        self.assertEqual(self.crypto_service.hash_video(self.video_path, HASH_SCHEME_SHA256),
+                         hashlib.sha256(b'test video content').hexdigest())
+        
+        # Check that an empty file hashes like empty content
+        with open(self.video_path, 'wb'):
+            pass
+        self.assertEqual(self.crypto_service.calculate_video_hash(self.video_path),
+                         hashlib.sha256(b'').hexdigest())
+        
+        # Check unsupported scheme
+        with self.assertRaises(AVCFCryptoError):
+            self.crypto_service.hash_video(self.video_path, "md5")
+    
+    @patch('avcf.domain.crypto.hash_video_streams')
+    def test_hash_video_cached(self, mock_hash_video_streams):
+        """Test that video hashes are reused until the file changes."""
+        mock_hash_video_streams.return_value = "0" * 64
+        
+        # Hash the same file twice
+        for _ in range(2):
+            self.assertEqual(self.crypto_service.hash_video(self.video_path, HASH_SCHEME_SHA256_STREAMS), "0" * 64)
+        mock_hash_video_streams.assert_called_once_with(self.video_path)
+        
+        # Check that other schemes are not served from the cache
+        self.assertEqual(self.crypto_service.hash_video(self.video_path, HASH_SCHEME_SHA256), EXPECTED_TEST_HASH)
+        
+        # Check that the file is hashed again after it changes
+        with open(self.video_path, 'ab') as f:
+            f.write(b' changed')
+        self.crypto_service.hash_video(self.video_path, HASH_SCHEME_SHA256_STREAMS)
+        self.assertEqual(mock_hash_video_streams.call_count, 2)
+        
+        # Check that a same-size rewrite is hashed again even if the modification time is restored
+        stat = os.stat(self.video_path)
+        time.sleep(0.01)
+        with open(self.video_path, 'r+b') as f:
+            f.write(b'TEST')
+        os.utime(self.video_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.crypto_service.hash_video(self.video_path, HASH_SCHEME_SHA256_STREAMS)
+        self.assertEqual(mock_hash_video_streams.call_count, 3)
     
-    @patch('gnupg.GPG')
-    def test_sign_metadata(self, mock_gpg_class):
+    def test_hash_videos(self):
+        """Test hashing several videos at once."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            contents = [b'first video', b'second video', b'']
+            video_paths = []
+            for index, content in enumerate(contents):
+                video_path = Path(temp_dir) / f'video{index}.mp4'
+                video_path.write_bytes(content)
+                video_paths.append(video_path)
+            
+            # Check that hashes are returned in order
+            self.assertEqual(self.crypto_service.hash_videos(video_paths, HASH_SCHEME_SHA256, max_workers=2),
+                             [hashlib.sha256(content).hexdigest() for content in contents])
+            
+            # Check that a missing file fails the batch
+            with self.assertRaises(AVCFCryptoError):
+                self.crypto_service.hash_videos(video_paths + [Path(temp_dir) / 'missing.mp4'], HASH_SCHEME_SHA256)
+    
+    def test_sign_metadata(self):
         """Test signing AVCF metadata."""
         # Mock GPG sign method
-        mock_gpg = MagicMock()
-        mock_gpg_class.return_value = mock_gpg
         mock_signature = MagicMock()
         mock_signature.__str__ = lambda self: "-----BEGIN PGP SIGNATURE-----\nTest Signature\n-----END PGP SIGNATURE-----"
-        mock_gpg.sign.return_value = mock_signature
-        
-        # Create a crypto service with mocked GPG
-        crypto_service = CryptoService(self.gnupg_home)
+        self.mock_gpg.sign.return_value = mock_signature
         
         # Create metadata
         metadata = AVCFMetadata(
@@ -95,28 +257,22 @@ class TestCryptoService(unittest.TestCase):
         )
         
         # Sign metadata
-        signed_block = crypto_service.sign_metadata(
+        signed_block = self.crypto_service.sign_metadata(
             metadata=metadata,
             key_id="test_key_id"
         )
         
         # Check that sign method was called
-        mock_gpg.sign.assert_called_once()
+        self.mock_gpg.sign.assert_called_once()
         
         # Check signed block
         self.assertEqual(signed_block.metadata, metadata)
         self.assertEqual(signed_block.signature, "-----BEGIN PGP SIGNATURE-----\nTest Signature\n-----END PGP SIGNATURE-----")
     
-    @patch('gnupg.GPG')
-    def test_sign_metadata_failure(self, mock_gpg_class):
+    def test_sign_metadata_failure(self):
         """Test signing AVCF metadata failure."""
         # Mock GPG sign method to return a falsy value
-        mock_gpg = MagicMock()
-        mock_gpg_class.return_value = mock_gpg
-        mock_gpg.sign.return_value = None
-        
-        # Create a crypto service with mocked GPG
-        crypto_service = CryptoService(self.gnupg_home)
+        self.mock_gpg.sign.return_value = None
         
         # Create metadata
         metadata = AVCFMetadata(
@@ -129,22 +285,15 @@ class TestCryptoService(unittest.TestCase):
         
         # Try to sign metadata
         with self.assertRaises(AVCFCryptoError):
-            crypto_service.sign_metadata(
+            self.crypto_service.sign_metadata(
                 metadata=metadata,
                 key_id="test_key_id"
             )
     
-    @patch('gnupg.GPG')
-    def test_verify_signature_valid(self, mock_gpg_class):
+    def test_verify_signature_valid(self):
         """Test verifying a valid signature."""
-        # Mock GPG verify_data method
-        mock_gpg = MagicMock()
-        mock_gpg_class.return_value = mock_gpg
-        mock_gpg.verify_data.return_value = True
-        mock_gpg.list_keys.return_value = [{'fingerprint': 'D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D'}]
-        
-        # Create a crypto service with mocked GPG
-        crypto_service = CryptoService(self.gnupg_home)
+        # Stub GPG with a valid signature and the signing key in the keyring
+        crypto_service = self._crypto_service_with(_StubGPG(True, TEST_FINGERPRINT))
         
         # Create metadata and signed block
         metadata = AVCFMetadata(
@@ -168,17 +317,92 @@ class TestCryptoService(unittest.TestCase):
         self.assertEqual(result.metadata, metadata)
         self.assertIsNone(result.error_message)
     
-    @patch('gnupg.GPG')
-    def test_verify_signature_invalid(self, mock_gpg_class):
-        """Test verifying an invalid signature."""
-        # Mock GPG verify_data method
-        mock_gpg = MagicMock()
-        mock_gpg_class.return_value = mock_gpg
-        mock_gpg.verify_data.return_value = False
-        mock_gpg.list_keys.return_value = [{'fingerprint': 'D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D'}]
+    def test_verify_signature_hash_mismatch(self):
+        """Test verifying a valid signature over a different video hash."""
+        # Stub GPG with a valid signature and the signing key in the keyring
+        crypto_service = self._crypto_service_with(_StubGPG(True, TEST_FINGERPRINT))
+        
+        # Create metadata and signed block
+        metadata = AVCFMetadata(
+            video_hash="e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
+            author_name="Test Author",
+            pubkey_fingerprint="D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D",
+            tool_name="avcf-test",
+            tool_version="0.1.0"
+        )
         
-        # Create a crypto service with mocked GPG
-        crypto_service = CryptoService(self.gnupg_home)
+        signed_block = SignedAVCFBlock(
+            metadata=metadata,
+            signature="-----BEGIN PGP SIGNATURE-----\nTest Signature\n-----END PGP SIGNATURE-----"
+        )
+        
+        # Verify signature with a matching and a different hash
+        result = crypto_service.verify_signature(signed_block, video_hash=metadata.video_hash)
+        self.assertEqual(result.status, SignatureStatus.VALID)
+        
+        result = crypto_service.verify_signature(signed_block, video_hash="0" * 64)
+        
+        # Check result
+        self.assertEqual(result.status, SignatureStatus.INVALID)
+        self.assertEqual(result.error_message, "Video hash does not match the hash in the metadata")
+    
+    def test_verify_signature_cached(self):
+        """Test that signature checks and the key list are cached until a key is imported."""
+        # Mock GPG methods
+        self.mock_gpg.verify_data.return_value = True
+        self.mock_gpg.list_keys.return_value = [{'fingerprint': 'D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D'}]
+        self.mock_gpg.import_keys.return_value.fingerprints = ['D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D']
+        
+        # Create metadata and signed block
+        metadata = AVCFMetadata(
+            video_hash="e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
+            author_name="Test Author",
+            pubkey_fingerprint="D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D",
+            tool_name="avcf-test",
+            tool_version="0.1.0"
+        )
+        
+        signed_block = SignedAVCFBlock(
+            metadata=metadata,
+            signature="-----BEGIN PGP SIGNATURE-----\nTest Signature\n-----END PGP SIGNATURE-----"
+        )
+        
+        # Verify the same block twice
+        for _ in range(2):
+            result = self.crypto_service.verify_signature(signed_block, video_hash=metadata.video_hash)
+            self.assertEqual(result.status, SignatureStatus.VALID)
+        
+        self.mock_gpg.verify_data.assert_called_once()
+        self.mock_gpg.list_keys.assert_called_once()
+        
+        # Importing a key discards the caches
+        self.crypto_service.import_key("-----BEGIN PGP PUBLIC KEY BLOCK-----")
+        result = self.crypto_service.verify_signature(signed_block)
+        
+        self.assertEqual(result.status, SignatureStatus.VALID)
+        self.assertEqual(self.mock_gpg.verify_data.call_count, 2)
+        self.assertEqual(self.mock_gpg.list_keys.call_count, 2)
+        
+        # Invalidating the keys re-reads the key list, indexed by fingerprint and key ID
+        self.mock_gpg.list_keys.return_value = [{'keyid': '5FBE8F7B07B4328D',
+                                                 'fingerprint': 'D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D'}]
+        self.crypto_service.invalidate_keys()
+        self.assertEqual(set(self.crypto_service.get_keys()),
+                         {'D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D', '5FBE8F7B07B4328D', '07B4328D'})
+        self.assertEqual(self.mock_gpg.list_keys.call_count, 3)
+    
+    def test_signature_file(self):
+        """Test that signature data is readable at the provided path only within the context."""
+        with signature_file(b'test signature') as sig_file_path:
+            with open(sig_file_path, 'rb') as f:
+                self.assertEqual(f.read(), b'test signature')
+        
+        self.assertFalse(os.path.exists(sig_file_path))
+    
+    def test_verify_signature_invalid(self):
+        """Test verifying an invalid signature."""
+        # Stub GPG with an invalid signature and the signing key in the keyring
+        crypto_service = self._crypto_service_with(_StubGPG(False, TEST_FINGERPRINT))
         
         # Create metadata and signed block
         metadata = AVCFMetadata(
@@ -202,16 +426,10 @@ class TestCryptoService(unittest.TestCase):
         self.assertEqual(result.metadata, metadata)
         self.assertEqual(result.error_message, "Invalid signature")
     
-    @patch('gnupg.GPG')
-    def test_verify_signature_key_not_found(self, mock_gpg_class):
+    def test_verify_signature_key_not_found(self):
         """Test verifying a signature with a missing key."""
-        # Mock GPG methods
-        mock_gpg = MagicMock()
-        mock_gpg_class.return_value = mock_gpg
-        mock_gpg.list_keys.return_value = [{'fingerprint': 'DIFFERENT_FINGERPRINT'}]
-        
-        # Create a crypto service with mocked GPG
-        crypto_service = CryptoService(self.gnupg_home)
+        # Stub GPG with only a different key in the keyring
+        crypto_service = self._crypto_service_with(_StubGPG(True, 'DIFFERENT_FINGERPRINT'))
         
         # Create metadata and signed block
         metadata = AVCFMetadata(
@@ -237,12 +455,9 @@ class TestCryptoService(unittest.TestCase):
     
     def test_verify_video_hash(self):
         """Test verifying video hash."""
-        # Calculate hash
-        hash_value = self.crypto_service.calculate_video_hash(self.video_path)
-        
         # Create metadata with correct hash
         metadata_correct = AVCFMetadata(
-            video_hash=hash_value,
+            video_hash=EXPECTED_TEST_HASH,
             author_name="Test Author",
             pubkey_fingerprint="D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D",
             tool_name="avcf-test",
@@ -8,13 +8,22 @@ import os
 import subprocess
 import json
 from pathlib import Path
+from unittest.mock import patch
 import shutil
 import gnupg
 
 from avcf.app.services import SigningService, VerificationService
 from avcf.domain.models import SignatureStatus
+from avcf.infra import container
+from avcf.infra.ffmpeg_wrapper import FFmpegWrapper
 
 
+# Ed25519 signing key for "AVCF Test <test@avcf.example>", protected with "testpassphrase"
+TEST_KEY_PATH = Path(__file__).parent / "fixtures" / "test_key.asc"
+TEST_KEY_FINGERPRINT = "94CE536DBEF317D59C3416527D37764DB2D641CE"
+
+
+@unittest.skipUnless(shutil.which('ffmpeg'), "FFmpeg is not installed")
 class TestAVCFIntegration(unittest.TestCase):
     """Integration tests for the AVCF system."""
     
@@ -27,28 +36,18 @@ class TestAVCFIntegration(unittest.TestCase):
         # Create a GPG instance
         cls.gpg = gnupg.GPG(gnupghome=cls.gnupg_home)
         
-        # Generate a test key
-        input_data = cls.gpg.gen_key_input(
-            name_real="AVCF Test",
-            name_email="test@avcf.example",
-            passphrase="testpassphrase",
-            key_type="RSA",
-            key_length=2048
-        )
-        cls.key = cls.gpg.gen_key(input_data)
+        # Import the pre-generated test key instead of generating one for each run
+        cls.gpg.import_keys(TEST_KEY_PATH.read_text())
+        cls.key_fingerprint = TEST_KEY_FINGERPRINT
         
         # Create a temporary directory for test files
         cls.test_dir = tempfile.mkdtemp()
         
-        # Create a test video file
+        # Create a short test video with an audio stream, since signatures hash the stream packets
         cls.video_path = Path(cls.test_dir) / "test_video.mp4"
-        with open(cls.video_path, "wb") as f:
-            # Write a minimal MP4 file header (not a valid MP4, but enough for testing)
-            f.write(b'\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42mp41\x00\x00\x00\x00')
-            f.write(b'\x00\x00\x00\x08free\x00\x00\x00\x00')
-            f.write(b'\x00\x00\x00\x08mdat\x00\x00\x00\x00')
-            # Add some dummy video data
-            f.write(b'\x00' * 1024)
+        subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc=duration=1:size=64x48:rate=10',
+                        '-f', 'lavfi', '-i', 'sine=duration=1', '-c:v', 'mpeg4', '-c:a', 'aac',
+                        str(cls.video_path)], check=True)
     
     @classmethod
     def tearDownClass(cls):
@@ -69,7 +68,7 @@ class TestAVCFIntegration(unittest.TestCase):
         signing_service.sign_video(
             input_path=self.video_path,
             output_path=output_path,
-            key_id=self.key.fingerprint,
+            key_id=self.key_fingerprint,
             author_name="AVCF Test",
             author_email="test@avcf.example",
             embed_pubkey=True,  # Embed the public key for offline verification
@@ -107,19 +106,16 @@ class TestAVCFIntegration(unittest.TestCase):
         signing_service.sign_video(
             input_path=self.video_path,
             output_path=signed_path,
-            key_id=self.key.fingerprint,
+            key_id=self.key_fingerprint,
             author_name="AVCF Test",
             embed_pubkey=True,
             passphrase="testpassphrase"
         )
         
-        # Create a tampered copy of the video
-        shutil.copy(signed_path, tampered_path)
-        
-        # Tamper with the video content
-        with open(tampered_path, "r+b") as f:
-            f.seek(100)  # Seek to a position in the video data
-            f.write(b'TAMPERED')  # Modify the data
+        # Write a tampered copy of the video, overwriting 8 bytes of the media data
+        data = signed_path.read_bytes()
+        offset = data.index(b'mdat') + 100
+        tampered_path.write_bytes(data[:offset] + b'TAMPERED' + data[offset + 8:])
         
         # Create verification service
         verification_service = VerificationService(gnupg_home=Path(self.gnupg_home))
@@ -131,6 +127,57 @@ class TestAVCFIntegration(unittest.TestCase):
         self.assertEqual(result.status, SignatureStatus.INVALID)
         self.assertIsNotNone(result.error_message)
         self.assertIn("hash", result.error_message.lower())
+    
+    @unittest.skipUnless(shutil.which('ffprobe'), "ffprobe is not installed")
+    def test_ffmpeg_process_and_sign(self):
+        """Test that videos processed and signed through FFmpeg verify."""
+        signing_service = SigningService(gnupg_home=Path(self.gnupg_home))
+        verification_service = VerificationService(gnupg_home=Path(self.gnupg_home))
+        
+        # Re-encode the video stream, and copy both streams through FFmpeg into a new file
+        cases = {
+            "ffmpeg_reencoded.mp4": {'output_args': {'c:v': 'mpeg4'}},
+            "ffmpeg_remuxed.mp4": {'output_args': {'c': 'copy', 'movflags': '+faststart'}},
+        }
+        
+        for name, ffmpeg_args in cases.items():
+            with self.subTest(output=name):
+                output_path = Path(self.test_dir) / name
+                FFmpegWrapper(signing_service).process_and_sign(
+                    input_path=self.video_path,
+                    output_path=output_path,
+                    key_id=self.key_fingerprint,
+                    author_name="AVCF Test",
+                    ffmpeg_args=ffmpeg_args,
+                    passphrase="testpassphrase"
+                )
+                
+                # Check that the signed hash matches the streams of the finished file
+                result = verification_service.verify_video(output_path)
+                self.assertEqual(result.status, SignatureStatus.VALID, result.error_message)
+
+    
+    @unittest.skipUnless(container.MP4 is not None and shutil.which('ffprobe'), "mutagen or ffprobe is not installed")
+    def test_verify_mp4_atom_without_mutagen(self):
+        """Test that an MP4 signed through mutagen verifies through the ffprobe fallback."""
+        output_path = Path(self.test_dir) / "mutagen_signed.mp4"
+        
+        signing_service = SigningService(gnupg_home=Path(self.gnupg_home))
+        signing_service.sign_video(
+            input_path=self.video_path,
+            output_path=output_path,
+            key_id=self.key_fingerprint,
+            author_name="AVCF Test",
+            passphrase="testpassphrase"
+        )
+        
+        # Verify on a host without mutagen
+        verification_service = VerificationService(gnupg_home=Path(self.gnupg_home))
+        with patch('avcf.infra.container.MP4', None):
+            result = verification_service.verify_video(output_path)
+        
+        self.assertEqual(result.status, SignatureStatus.VALID, result.error_message)
+        self.assertEqual(result.metadata.author_name, "AVCF Test")
 
 
 if __name__ == '__main__':
@@ -38,6 +38,81 @@ class TestAVCFModels(unittest.TestCase):
                 tool_name="avcf-test",
                 tool_version="0.1.0"
             )
+        
+        # Video hash that is not 64 hexadecimal digits
+        with self.assertRaises(ValidationError):
+            AVCFMetadata(
+                video_hash="e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b85g",
+                author_name="Test Author",
+                pubkey_fingerprint="D4C9 D8F2 E1A1 D8BB 2F09 768A 5FBE 8F7B 07B4 328D",
+                tool_name="avcf-test",
+                tool_version="0.1.0"
+            )
+        
+        # Hash scheme that is not supported
+        with self.assertRaises(ValidationError):
+            AVCFMetadata(
+                video_hash="e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
+                hash_scheme="sha256-tree",
+                author_name="Test Author",
+                pubkey_fingerprint="D4C9 D8F2 E1A1 D8BB 2F09 768A 5FBE 8F7B 07B4 328D",
+                tool_name="avcf-test",
+                tool_version="0.1.0"
+            )
+    
+    def test_avcf_metadata_canonical_json(self):
+        """Test that the canonical JSON follows copies of the frozen metadata."""
+        metadata = AVCFMetadata(
+            video_hash="e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
+            author_name="Test Author",
+            pubkey_fingerprint="D4C9 D8F2 E1A1 D8BB 2F09 768A 5FBE 8F7B 07B4 328D",
+            timestamp=datetime.utcnow(),
+            tool_name="avcf-test",
+            tool_version="0.1.0"
+        )
+        
+        self.assertEqual(metadata.canonical_json, metadata.model_dump_json(exclude={'hash_scheme'}))
+        
+        # Metadata read back from its JSON serializes to the same bytes, so signatures still verify
+        parsed = AVCFMetadata.model_validate_json(metadata.canonical_json)
+        self.assertEqual(parsed.canonical_json, metadata.canonical_json)
+        
+        # Fields cannot be changed in place; updated copies are serialized again
+        with self.assertRaises(ValidationError):
+            metadata.notes = "Test notes"
+        copied = metadata.model_copy(update={'notes': "Other notes", 'hash_scheme': "sha256-streams"})
+        self.assertEqual(copied.canonical_json, copied.model_dump_json())
+        self.assertIn("Other notes", copied.canonical_json)
+    
+    def test_avcf_metadata_canonical_json_legacy(self):
+        """Test that metadata signed before the hash scheme fields existed keeps its canonical JSON."""
+        # Metadata JSON as serialized and signed before hash_scheme was added
+        legacy_json = (
+            '{"video_hash":"e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",'
+            '"author_name":"Test Author","author_email":null,"author_organization":null,'
+            '"pubkey_fingerprint":"D4C9 D8F2 E1A1 D8BB 2F09 768A 5FBE 8F7B 07B4 328D","pubkey_url":null,'
+            '"embedded_pubkey":null,"timestamp":"2025-06-16T03:12:59","tool_name":"avcf-test",'
+            '"tool_version":"0.1.0","tags":null,"notes":null}'
+        )
+        
+        metadata = AVCFMetadata.model_validate_json(legacy_json)
+        self.assertEqual(metadata.hash_scheme, "sha256")
+        self.assertEqual(metadata.canonical_json, legacy_json)
+    
+    def test_avcf_metadata_normalized_fingerprint(self):
+        """Test that the fingerprint is normalized without changing the signed JSON."""
+        metadata = AVCFMetadata(
+            video_hash="e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
+            author_name="Test Author",
+            pubkey_fingerprint="d4c9 D8F2 E1A1 D8BB 2F09 768A 5FBE 8F7B 07B4 328D",
+            tool_name="avcf-test",
+            tool_version="0.1.0"
+        )
+        
+        self.assertEqual(metadata.normalized_fingerprint, "D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D")
+        self.assertIn("d4c9 D8F2", metadata.canonical_json)
+        copied = metadata.model_copy(update={'pubkey_fingerprint': "07B4 328D"})
+        self.assertEqual(copied.normalized_fingerprint, "07B4328D")
     
     def test_signed_avcf_block_creation(self):
         """Test creating a valid signed AVCF block."""
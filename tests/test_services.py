@@ -3,128 +3,125 @@ Unit tests for the AVCF application services.
 """
 
 import unittest
-import tempfile
 import os
+import tempfile
 from pathlib import Path
+from types import SimpleNamespace
 from unittest.mock import patch, MagicMock
 
-from avcf.app.services import SigningService, VerificationService
+from avcf.app.services import SigningService, VerificationService, shared_crypto_service
 from avcf.domain.models import AVCFMetadata, SignedAVCFBlock, SignatureStatus, VerificationResult
 from avcf.domain.crypto import CryptoService
 from avcf.infra.exceptions import AVCFError, AVCFKeyError
 
 
+# Keys returned by the mocked crypto service, indexed like CryptoService.get_keys; the services
+# only read them, so tests share them
+TEST_KEY = {'keyid': '5FBE8F7B07B4328D', 'fingerprint': 'D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D'}
+TEST_KEYS = {TEST_KEY['fingerprint']: TEST_KEY, TEST_KEY['keyid']: TEST_KEY, TEST_KEY['keyid'][-8:]: TEST_KEY}
+
+
 class TestSigningService(unittest.TestCase):
     """Test cases for AVCF signing service."""
     
+    @classmethod
+    def setUpClass(cls):
+        """Set up the test files shared by all tests and mock container adapters."""
+        # Create one temporary directory for the GnuPG home, the test video and the output;
+        # container adapters are mocked, so no test writes the output
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.gnupg_home = Path(cls.temp_dir.name)
+        cls.video_path = Path(cls.temp_dir.name) / 'video.mp4'
+        cls.video_path.write_bytes(b'test video content')
+        cls.output_path = Path(cls.temp_dir.name) / 'output.mp4'
+        
+        cls._create_adapter_patcher = patch('avcf.infra.container.ContainerFactory.create_adapter')
+        cls.mock_create_adapter = cls._create_adapter_patcher.start()
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Stop mocking container adapters and clean up the shared files."""
+        cls._create_adapter_patcher.stop()
+        cls.temp_dir.cleanup()
+    
     def setUp(self):
         """Set up test environment."""
-        # Create a temporary directory for GnuPG home
-        self.temp_dir = tempfile.TemporaryDirectory()
-        self.gnupg_home = Path(self.temp_dir.name)
-        
-        # Create a temporary video file
-        self.video_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-        self.video_file.write(b'test video content')
-        self.video_file.close()
-        self.video_path = Path(self.video_file.name)
-        
-        # Create a temporary output file
-        self.output_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-        self.output_file.close()
-        self.output_path = Path(self.output_file.name)
-    
-    def tearDown(self):
-        """Clean up test environment."""
-        # Remove temporary files
-        os.unlink(self.video_path)
-        os.unlink(self.output_path)
-        
-        # Clean up temporary directory
-        self.temp_dir.cleanup()
+        # Use a fresh container adapter mock
+        self.mock_create_adapter.reset_mock()
+        self.mock_adapter = MagicMock()
+        self.mock_create_adapter.return_value = self.mock_adapter
     
-    @patch('avcf.domain.crypto.CryptoService')
-    @patch('avcf.infra.container.ContainerFactory.create_adapter')
-    def test_sign_video(self, mock_create_adapter, mock_crypto_service_class):
-        """Test signing a video."""
+    def test_sign_video_key_lookup(self):
+        """Test that keys are looked up in the crypto service's key cache."""
         # Mock crypto service
         mock_crypto_service = MagicMock()
-        mock_crypto_service_class.return_value = mock_crypto_service
-        
-        # Mock GPG key list
-        mock_crypto_service.gpg.list_keys.return_value = [
-            {'keyid': 'test_key_id', 'fingerprint': 'D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D'}
-        ]
-        
-        # Mock metadata creation
-        metadata = AVCFMetadata(
-            video_hash="e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
-            author_name="Test Author",
-            pubkey_fingerprint="D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D",
-            tool_name="avcf-sign",
-            tool_version="0.1.0"
-        )
-        mock_crypto_service.create_metadata.return_value = metadata
-        
-        # Mock signature creation
-        signed_block = SignedAVCFBlock(
-            metadata=metadata,
-            signature="-----BEGIN PGP SIGNATURE-----\nTest Signature\n-----END PGP SIGNATURE-----"
-        )
-        mock_crypto_service.sign_metadata.return_value = signed_block
-        
-        # Mock container adapter
-        mock_adapter = MagicMock()
-        mock_create_adapter.return_value = mock_adapter
+        mock_crypto_service.get_keys.return_value = TEST_KEYS
         
         # Create signing service
         signing_service = SigningService(mock_crypto_service)
         
-        # Sign video
-        result_path = signing_service.sign_video(
-            input_path=self.video_path,
-            output_path=self.output_path,
-            key_id="test_key_id",
-            author_name="Test Author"
-        )
+        # Sign twice, using a short key ID and the full fingerprint
+        for key_id in ("07B4328D", "D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D"):
+            signing_service.sign_video(
+                input_path=self.video_path,
+                output_path=self.output_path,
+                key_id=key_id,
+                author_name="Test Author"
+            )
         
-        # Check that methods were called correctly
-        mock_crypto_service.gpg.list_keys.assert_called_once()
-        mock_crypto_service.create_metadata.assert_called_once_with(
-            video_path=self.video_path,
-            author_name="Test Author",
-            pubkey_fingerprint="D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D",
-            author_email=None,
-            author_organization=None,
-            pubkey_url=None,
-            embedded_pubkey=None,
-            tags=None,
-            notes=None
-        )
-        mock_crypto_service.sign_metadata.assert_called_once_with(
-            metadata=metadata,
-            key_id="test_key_id",
-            passphrase=None
-        )
-        mock_create_adapter.assert_called_once_with(self.video_path)
-        mock_adapter.embed_metadata.assert_called_once_with(
-            input_path=self.video_path,
-            output_path=self.output_path,
-            metadata_block=signed_block
+        # Check that both key IDs were found in the shared key cache
+        self.assertEqual(mock_crypto_service.get_keys.call_count, 2)
+        self.assertEqual(
+            mock_crypto_service.create_metadata.call_args.kwargs['pubkey_fingerprint'],
+            "D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D"
         )
         
-        # Check result
-        self.assertEqual(result_path, self.output_path)
+        # Check that invalidating the keys invalidates the shared key cache
+        signing_service.invalidate_keys()
+        mock_crypto_service.invalidate_keys.assert_called_once()
     
-    @patch('avcf.domain.crypto.CryptoService')
-    def test_sign_video_key_not_found(self, mock_crypto_service_class):
+    @patch('avcf.app.services.CryptoService')
+    def test_services_share_crypto_service(self, mock_crypto_service_class):
+        """Test that services for the same GnuPG home share one crypto service."""
+        shared_crypto_service.cache_clear()
+        self.addCleanup(shared_crypto_service.cache_clear)
+        
+        signing_service = SigningService(gnupg_home=self.gnupg_home)
+        verification_service = VerificationService(gnupg_home=self.gnupg_home / '.')
+        
+        # Check that only one crypto service was created
+        mock_crypto_service_class.assert_called_once_with(self.gnupg_home.resolve())
+        self.assertIs(signing_service.crypto_service, verification_service.crypto_service)
+    
+    @patch('avcf.app.services.CryptoService')
+    def test_close_services(self, mock_crypto_service_class):
+        """Test that services close only the crypto services they own."""
+        shared_crypto_service.cache_clear()
+        self.addCleanup(shared_crypto_service.cache_clear)
+        
+        # A service without a GnuPG home owns its crypto service
+        with VerificationService() as verification_service:
+            verification_service._get_session()
+        mock_crypto_service_class.return_value.close.assert_called_once()
+        self.assertIsNone(verification_service._session)
+        
+        # Shared and passed-in crypto services are left open
+        mock_crypto_service_class.return_value.close.reset_mock()
+        with SigningService(gnupg_home=self.gnupg_home):
+            pass
+        crypto_service = MagicMock()
+        with SigningService(crypto_service=crypto_service):
+            pass
+        mock_crypto_service_class.return_value.close.assert_not_called()
+        crypto_service.close.assert_not_called()
+    
+    def test_sign_video_key_not_found(self):
         """Test signing a video with a key that doesn't exist."""
         # Mock crypto service
         mock_crypto_service = MagicMock()
-        mock_crypto_service_class.return_value = mock_crypto_service
         
-        # Mock GPG key list (empty)
-        mock_crypto_service.gpg.list_keys.return_value = []
+        # Mock key list (empty)
+        mock_crypto_service.get_keys.return_value = {}
         
         # Create signing service
         signing_service = SigningService(mock_crypto_service)
@@ -139,23 +136,104 @@ class TestSigningService(unittest.TestCase):
             )
 
 
+class TestSignVideo(unittest.TestCase):
+    """Test cases for the calls made while signing a video, sharing one signing run."""
+    
+    @classmethod
+    def setUpClass(cls):
+        """Sign a test video once with a mocked crypto service and container adapter."""
+        # Create the test video in a temporary directory
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.video_path = Path(cls.temp_dir.name) / 'video.mp4'
+        cls.video_path.write_bytes(b'test video content')
+        cls.output_path = Path(cls.temp_dir.name) / 'output.mp4'
+        
+        # Mock crypto service
+        cls.mock_crypto_service = MagicMock()
+        cls.mock_crypto_service.get_keys.return_value = TEST_KEYS
+        
+        # Mock metadata creation
+        cls.metadata = AVCFMetadata(
+            video_hash="e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
+            author_name="Test Author",
+            pubkey_fingerprint="D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D",
+            tool_name="avcf-sign",
+            tool_version="0.1.0"
+        )
+        cls.mock_crypto_service.create_metadata.return_value = cls.metadata
+        
+        # Mock signature creation
+        cls.signed_block = SignedAVCFBlock(
+            metadata=cls.metadata,
+            signature="-----BEGIN PGP SIGNATURE-----\nTest Signature\n-----END PGP SIGNATURE-----"
+        )
+        cls.mock_crypto_service.sign_metadata.return_value = cls.signed_block
+        
+        # Sign video
+        with patch('avcf.infra.container.ContainerFactory.create_adapter') as mock_create_adapter:
+            signing_service = SigningService(cls.mock_crypto_service)
+            cls.result_path = signing_service.sign_video(
+                input_path=cls.video_path,
+                output_path=cls.output_path,
+                key_id="5FBE8F7B07B4328D",
+                author_name="Test Author"
+            )
+        cls.mock_create_adapter = mock_create_adapter
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up the test files."""
+        cls.temp_dir.cleanup()
+    
+    def test_sign_video_returns_output_path(self):
+        """Test that signing returns the output path."""
+        self.assertEqual(self.result_path, self.output_path)
+    
+    def test_sign_video_reads_key_list(self):
+        """Test that signing reads the key list once."""
+        self.mock_crypto_service.get_keys.assert_called_once()
+    
+    def test_sign_video_creates_metadata(self):
+        """Test that metadata is created for the video with the fingerprint of the signing key."""
+        self.mock_crypto_service.create_metadata.assert_called_once()
+        create_metadata_kwargs = self.mock_crypto_service.create_metadata.call_args.kwargs
+        self.assertEqual(create_metadata_kwargs['video_path'], self.video_path)
+        self.assertEqual(create_metadata_kwargs['author_name'], "Test Author")
+        self.assertEqual(create_metadata_kwargs['pubkey_fingerprint'], "D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D")
+    
+    def test_sign_video_signs_metadata(self):
+        """Test that the created metadata is signed with the requested key."""
+        self.mock_crypto_service.sign_metadata.assert_called_once_with(
+            metadata=self.metadata,
+            key_id="5FBE8F7B07B4328D",
+            passphrase=None
+        )
+    
+    def test_sign_video_embeds_signed_block(self):
+        """Test that the signed block is embedded in the output by the adapter for the input."""
+        self.mock_create_adapter.assert_called_once_with(self.video_path)
+        self.mock_create_adapter.return_value.embed_metadata.assert_called_once_with(
+            input_path=self.video_path,
+            output_path=self.output_path,
+            metadata_block=self.signed_block
+        )
+
+
 class TestVerificationService(unittest.TestCase):
     """Test cases for AVCF verification service."""
     
-    def setUp(self):
-        """Set up test environment."""
-        # Create a temporary directory for GnuPG home
-        self.temp_dir = tempfile.TemporaryDirectory()
-        self.gnupg_home = Path(self.temp_dir.name)
-        
-        # Create a temporary video file
-        self.video_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-        self.video_file.write(b'test video content')
-        self.video_file.close()
-        self.video_path = Path(self.video_file.name)
-        
-        # Create test metadata
-        self.metadata = AVCFMetadata(
+    @classmethod
+    def setUpClass(cls):
+        """Set up the test video and signed metadata shared by all tests."""
+        # Create one temporary directory for the test files
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        
+        # Create the test video once; tests that change a video use their own file
+        cls.video_path = Path(cls.temp_dir.name) / 'video.mp4'
+        cls.video_path.write_bytes(b'test video content')
+        
+        # Create test metadata; the models are frozen, so tests can share them
+        cls.metadata = AVCFMetadata(
             video_hash="e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
             author_name="Test Author",
             pubkey_fingerprint="D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D",
@@ -165,148 +243,157 @@ class TestVerificationService(unittest.TestCase):
         )
         
         # Create signed block
-        self.signed_block = SignedAVCFBlock(
-            metadata=self.metadata,
+        cls.signed_block = SignedAVCFBlock(
+            metadata=cls.metadata,
             signature="-----BEGIN PGP SIGNATURE-----\nTest Signature\n-----END PGP SIGNATURE-----"
         )
-    
-    def tearDown(self):
-        """Clean up test environment."""
-        # Remove temporary files
-        os.unlink(self.video_path)
-        
-        # Clean up temporary directory
-        self.temp_dir.cleanup()
-    
-    @patch('avcf.domain.crypto.CryptoService')
-    @patch('avcf.infra.container.ContainerFactory.create_adapter')
-    def test_verify_video_valid(self, mock_create_adapter, mock_crypto_service_class):
-        """Test verifying a valid video signature."""
-        # Mock crypto service
-        mock_crypto_service = MagicMock()
-        mock_crypto_service_class.return_value = mock_crypto_service
         
-        # Mock container adapter
-        mock_adapter = MagicMock()
-        mock_create_adapter.return_value = mock_adapter
-        mock_adapter.extract_metadata.return_value = self.signed_block
-        
-        # Mock signature verification
-        mock_crypto_service.verify_signature.return_value = VerificationResult(
+        # Create the result of a successful signature check
+        cls.valid_result = VerificationResult(
             status=SignatureStatus.VALID,
-            metadata=self.metadata
+            metadata=cls.metadata
         )
         
-        # Mock hash verification
-        mock_crypto_service.verify_video_hash.return_value = True
-        
-        # Create verification service
-        verification_service = VerificationService(mock_crypto_service)
-        
-        # Verify video
-        result = verification_service.verify_video(self.video_path)
-        
-        # Check that methods were called correctly
-        mock_create_adapter.assert_called_once_with(self.video_path)
-        mock_adapter.extract_metadata.assert_called_once_with(self.video_path)
-        mock_crypto_service.verify_signature.assert_called_once_with(self.signed_block)
-        mock_crypto_service.verify_video_hash.assert_called_once_with(self.video_path, self.metadata)
-        
-        # Check result
-        self.assertEqual(result.status, SignatureStatus.VALID)
-        self.assertEqual(result.metadata, self.metadata)
-        self.assertIsNone(result.error_message)
+        # Mock container adapters for all tests
+        cls._create_adapter_patcher = patch('avcf.infra.container.ContainerFactory.create_adapter')
+        cls.mock_create_adapter = cls._create_adapter_patcher.start()
     
-    @patch('avcf.domain.crypto.CryptoService')
-    @patch('avcf.infra.container.ContainerFactory.create_adapter')
-    def test_verify_video_invalid_hash(self, mock_create_adapter, mock_crypto_service_class):
-        """Test verifying a video with an invalid hash."""
-        # Mock crypto service
-        mock_crypto_service = MagicMock()
-        mock_crypto_service_class.return_value = mock_crypto_service
-        
-        # Mock container adapter
-        mock_adapter = MagicMock()
-        mock_create_adapter.return_value = mock_adapter
-        mock_adapter.extract_metadata.return_value = self.signed_block
-        
-        # Mock signature verification
-        mock_crypto_service.verify_signature.return_value = VerificationResult(
-            status=SignatureStatus.VALID,
-            metadata=self.metadata
+    @classmethod
+    def tearDownClass(cls):
+        """Stop mocking container adapters and clean up the shared files."""
+        cls._create_adapter_patcher.stop()
+        cls.temp_dir.cleanup()
+    
+    def setUp(self):
+        """Set up test environment."""
+        # Use a fresh container adapter mock that finds the signed block
+        self.mock_create_adapter.reset_mock()
+        self.mock_adapter = MagicMock()
+        self.mock_adapter.extract_metadata.return_value = self.signed_block
+        self.mock_create_adapter.return_value = self.mock_adapter
+    
+    def test_verify_video(self):
+        """Test verifying a valid video, videos with an invalid hash or signature and a video without metadata."""
+        invalid_result = VerificationResult(
+            status=SignatureStatus.INVALID,
+            metadata=self.metadata,
+            error_message="Video hash does not match the hash in the metadata"
+        )
+        invalid_signature_result = VerificationResult(
+            status=SignatureStatus.INVALID,
+            metadata=self.metadata,
+            error_message="Invalid signature"
+        )
+        missing_result = VerificationResult(
+            status=SignatureStatus.MISSING,
+            error_message="No AVCF metadata found in the video file"
         )
         
-        # Mock hash verification (fails)
-        mock_crypto_service.verify_video_hash.return_value = False
-        
-        # Create verification service
-        verification_service = VerificationService(mock_crypto_service)
-        
-        # Verify video
-        result = verification_service.verify_video(self.video_path)
+        # Extracted block, calculated hash, result of the signature check and expected result
+        cases = [
+            (self.signed_block, self.metadata.video_hash, self.valid_result, self.valid_result),
+            (self.signed_block, "0" * 64, self.valid_result, invalid_result),
+            (self.signed_block, self.metadata.video_hash, invalid_signature_result, invalid_signature_result),
+            (None, None, None, missing_result),
+        ]
         
-        # Check result
-        self.assertEqual(result.status, SignatureStatus.INVALID)
-        self.assertEqual(result.metadata, self.metadata)
-        self.assertEqual(result.error_message, "Video hash does not match the hash in the metadata")
+        for signed_block, video_hash, verify_result, expected in cases:
+            with self.subTest(status=expected.status, error=expected.error_message):
+                # Mock crypto service (key found)
+                mock_crypto_service = MagicMock()
+                mock_crypto_service.get_keys.return_value = TEST_KEYS
+                mock_crypto_service.hash_video.return_value = video_hash
+                mock_crypto_service.verify_signature.return_value = verify_result
+                
+                # Mock container adapter, forgetting calls from earlier cases
+                self.mock_create_adapter.reset_mock()
+                self.mock_adapter.reset_mock()
+                self.mock_adapter.extract_metadata.return_value = signed_block
+                
+                # Verify video
+                verification_service = VerificationService(mock_crypto_service)
+                result = verification_service.verify_video(self.video_path)
+                
+                # Check that the signature is checked if there is metadata, and the video is only
+                # hashed once the signature is valid
+                self.mock_create_adapter.assert_called_once_with(self.video_path)
+                self.mock_adapter.extract_metadata.assert_called_once_with(self.video_path)
+                if signed_block is None:
+                    mock_crypto_service.verify_signature.assert_not_called()
+                else:
+                    mock_crypto_service.verify_signature.assert_called_once_with(signed_block)
+                if verify_result is None or verify_result.status != SignatureStatus.VALID:
+                    mock_crypto_service.hash_video.assert_not_called()
+                else:
+                    mock_crypto_service.hash_video.assert_called_once_with(self.video_path, "sha256")
+                
+                # Check result
+                self.assertEqual(result.status, expected.status)
+                self.assertEqual(result.metadata, expected.metadata)
+                self.assertEqual(result.error_message, expected.error_message)
     
-    @patch('avcf.domain.crypto.CryptoService')
-    @patch('avcf.infra.container.ContainerFactory.create_adapter')
-    def test_verify_video_missing_metadata(self, mock_create_adapter, mock_crypto_service_class):
-        """Test verifying a video with missing metadata."""
+    def test_verify_video_cached(self):
+        """Test that repeated verification of an unchanged file is served from the cache."""
         # Mock crypto service
         mock_crypto_service = MagicMock()
-        mock_crypto_service_class.return_value = mock_crypto_service
-        
-        # Mock container adapter
-        mock_adapter = MagicMock()
-        mock_create_adapter.return_value = mock_adapter
-        mock_adapter.extract_metadata.return_value = None
+        mock_crypto_service.get_keys.return_value = TEST_KEYS
+        mock_crypto_service.verify_signature.return_value = self.valid_result
+        mock_crypto_service.hash_video.return_value = self.metadata.video_hash
         
-        # Create verification service
+        # Verify the same video twice, using a copy that this test modifies
+        video_path = Path(self.temp_dir.name) / 'cached.mp4'
+        video_path.write_bytes(b'test video content')
         verification_service = VerificationService(mock_crypto_service)
-        
-        # Verify video
-        result = verification_service.verify_video(self.video_path)
-        
-        # Check result
-        self.assertEqual(result.status, SignatureStatus.MISSING)
-        self.assertIsNone(result.metadata)
-        self.assertEqual(result.error_message, "No AVCF metadata found in the video file")
+        first = verification_service.verify_video(video_path)
+        second = verification_service.verify_video(video_path)
+        
+        # Check that the signature and hash were only verified once
+        mock_crypto_service.verify_signature.assert_called_once()
+        mock_crypto_service.hash_video.assert_called_once()
+        self.assertEqual(second.status, SignatureStatus.VALID)
+        self.assertEqual(second.metadata, first.metadata)
+        self.assertGreaterEqual(second.verification_time, first.verification_time)
+        
+        # Check that modifying the file invalidates the cached result
+        with open(video_path, 'ab') as f:
+            f.write(b'tampered')
+        verification_service.verify_video(video_path)
+        self.assertEqual(mock_crypto_service.verify_signature.call_count, 2)
+        
+        # Check that replacing the file with a tampered one of the same size and modification
+        # time also invalidates it
+        stat = os.stat(video_path)
+        tampered_path = Path(self.temp_dir.name) / 'tampered.mp4'
+        tampered_path.write_bytes(b'TEST video contenttampered')
+        os.utime(tampered_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tampered_path, video_path)
+        verification_service.verify_video(video_path)
+        self.assertEqual(mock_crypto_service.verify_signature.call_count, 3)
     
-    @patch('avcf.domain.crypto.CryptoService')
-    @patch('avcf.infra.container.ContainerFactory.create_adapter')
-    @patch('avcf.app.services.requests.get')
-    def test_verify_video_fetch_key(self, mock_get, mock_create_adapter, mock_crypto_service_class):
+    @patch('avcf.app.services.requests.Session')
+    def test_verify_video_fetch_key(self, mock_session_class):
         """Test verifying a video and fetching a key."""
         # Mock crypto service
         mock_crypto_service = MagicMock()
-        mock_crypto_service_class.return_value = mock_crypto_service
         
         # Mock key check (key not found)
-        mock_crypto_service.gpg.list_keys.return_value = []
-        
-        # Mock container adapter
-        mock_adapter = MagicMock()
-        mock_create_adapter.return_value = mock_adapter
-        mock_adapter.extract_metadata.return_value = self.signed_block
+        mock_crypto_service.get_keys.return_value = {}
         
         # Mock HTTP request
-        mock_response = MagicMock()
-        mock_response.text = "-----BEGIN PGP PUBLIC KEY BLOCK-----\nTest Key\n-----END PGP PUBLIC KEY BLOCK-----"
+        key_data = "-----BEGIN PGP PUBLIC KEY BLOCK-----\nTest Key\n-----END PGP PUBLIC KEY BLOCK-----"
+        mock_response = SimpleNamespace(status_code=200, content=key_data.encode('ascii'),
+                                        raise_for_status=lambda: None)
+        mock_get = mock_session_class.return_value.get
         mock_get.return_value = mock_response
         
         # Mock key import
         mock_crypto_service.import_key.return_value = ["D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D"]
         
         # Mock signature verification
-        mock_crypto_service.verify_signature.return_value = VerificationResult(
-            status=SignatureStatus.VALID,
-            metadata=self.metadata
-        )
+        mock_crypto_service.verify_signature.return_value = self.valid_result
         
-        # Mock hash verification
-        mock_crypto_service.verify_video_hash.return_value = True
+        # Mock video hashing
+        mock_crypto_service.hash_video.return_value = self.metadata.video_hash
         
         # Create verification service
         verification_service = VerificationService(mock_crypto_service)
@@ -315,11 +402,60 @@ class TestVerificationService(unittest.TestCase):
         result = verification_service.verify_video(self.video_path)
         
         # Check that methods were called correctly
-        mock_get.assert_called_once_with("https://example.com/keys/test.asc", timeout=10)
-        mock_crypto_service.import_key.assert_called_once_with(mock_response.text)
+        mock_get.assert_called_once_with("https://example.com/keys/test.asc", timeout=10,
+                                         headers={'Accept': 'application/pgp-keys, text/plain'})
+        mock_crypto_service.import_key.assert_called_once_with(key_data)
+        
+        # Check that the video was hashed once, after the signature check
+        mock_crypto_service.hash_video.assert_called_once()
         
         # Check result
         self.assertEqual(result.status, SignatureStatus.VALID)
+    
+    @patch('avcf.app.services.requests.Session')
+    def test_fetch_key_disk_cache(self, mock_session_class):
+        """Test that fetched keys are cached on disk between services."""
+        # Mock crypto service
+        mock_crypto_service = MagicMock()
+        mock_crypto_service.get_keys.return_value = {}
+        mock_crypto_service.import_key.return_value = ["D4C9D8F2E1A1D8BB2F09768A5FBE8F7B07B4328D"]
+        
+        # Mock HTTP request
+        key_data = "-----BEGIN PGP PUBLIC KEY BLOCK-----\nTest Key\n-----END PGP PUBLIC KEY BLOCK-----"
+        mock_response = SimpleNamespace(status_code=200, content=key_data.encode('ascii'),
+                                        raise_for_status=lambda: None)
+        mock_get = mock_session_class.return_value.get
+        mock_get.return_value = mock_response
+        
+        url = "https://example.com/keys/test.asc"
+        key_cache_dir = Path(self.temp_dir.name) / "keys"
+        
+        # Fetch the key with two services sharing the cache directory
+        for _ in range(2):
+            verification_service = VerificationService(mock_crypto_service, key_cache_dir=key_cache_dir)
+            verification_service._fetch_key(url)
+        
+        # Check that the key was only downloaded once but imported by both services
+        mock_get.assert_called_once()
+        mock_session_class.assert_called_once()
+        self.assertEqual(mock_crypto_service.import_key.call_count, 2)
+        mock_crypto_service.import_key.assert_called_with(key_data)
+        
+        # Check that an expired key is revalidated with If-Modified-Since
+        mock_response.status_code = 304
+        verification_service = VerificationService(mock_crypto_service, key_cache_dir=key_cache_dir,
+                                                   key_cache_ttl=0)
+        verification_service._fetch_key(url)
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertIn('If-Modified-Since', mock_get.call_args.kwargs['headers'])
+        mock_crypto_service.import_key.assert_called_with(key_data)
+        
+        # Check that a key that is not ASCII-armored is rejected
+        mock_response.status_code = 200
+        mock_response.content = b"\xff\xfe"
+        verification_service = VerificationService(mock_crypto_service, key_cache_ttl=0)
+        with self.assertRaises(AVCFKeyError):
+            verification_service._fetch_key(url)
 
 
 if __name__ == '__main__':